@@ -2,3 +2,6 @@ from flask_restful import reqparse
 
 parser = reqparse.RequestParser()
 parser.add_argument('text', required=True)
+
+batchParser = reqparse.RequestParser()
+batchParser.add_argument('texts', type=str, action='append', required=True, location='json')
@@ -1,44 +1,114 @@
-from flask import jsonify
+from collections import Counter, deque
+from flask import jsonify, request, stream_with_context, Response
 from flask_restful import abort, Resource
-from data import dbSession
-from data.mistakes import Mistake
-from data.languages import Language
-from modules import speller, translator
-from .beautifierParser import parser
-import copy
-import pymorphy2
+from modules import speller, corrector, statistics
+from .beautifierParser import parser, batchParser
+import codecs
+import json
+
+READ_SIZE = 64 * 1024  # Размер блока, которым читается загруженный документ
+STREAM_AHEAD = 2  # Сколько окон документа проверяется заранее, пока исправляется текущее
+MAX_BATCH = 100  # Максимальное число текстов в одном пакете
 
 
 class BeautifierResource(Resource):
     def get(self):
-        morph = pymorphy2.MorphAnalyzer()
         args = parser.parse_args()
         text = args['text']
-        mistakes = speller.getMistakes(text)
-        corrected = copy.copy(text)
-        delta = 0
-        tablelist = []
-        for m in mistakes:
-            correct = m['s'][0]
-            wrong = text[m['pos']:m['pos'] + m['len']]
-            normal = morph.parse(correct)[0].normal_form
-            langAcronym = translator.getLanguage(correct)
-            corrected = corrected[:m['pos'] + delta] + \
-                correct + corrected[m['pos'] + m['len'] + delta:]
-            delta += len(correct) - len(wrong)
-            session = dbSession.createSession()
-            language = session.query(Language).filter(Language.acronym == langAcronym).first()
-            if not language:
-                language = Language(acronym=langAcronym)
-                session.add(language)
-            mistake = session.query(Mistake).filter(Mistake.name == normal).first()
-            if not mistake:
-                mistake = Mistake(name=normal, count=0, language=language.id)
-                session.add(mistake)
-            mistake.count += 1
-            session.commit()
-            tablelist.append({'wrong': wrong.lower(),
-                              'correct': correct.lower(),
-                              'pos': m['pos'],
-                              'lang': langAcronym})
+        try:
+            mistakes = speller.getMistakes(text)
+        except speller.SpellerError:
+            abort(503, message='Speller is unavailable')
+        corrected, tablelist = corrector.correct(text, mistakes)
         return jsonify({'corrected_text': corrected, 'mistakes': tablelist})
+
+    def post(self):
+        ''' Исправляет документ любой длины по частям. Документ передаётся файлом file
+            или телом запроса, результат отдаётся по строке NDJSON на окно текста '''
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                abort(400, message='File is missing')
+            stream = upload.stream
+        elif request.mimetype == 'application/x-www-form-urlencoded':
+            # Тело формы уже разобрано в request.form, документ из него не прочитать
+            abort(415, message='Document must be sent as a file or as the request body')
+        else:
+            stream = request.stream
+        return Response(stream_with_context(correctStream(readText(stream))),
+                        mimetype='application/x-ndjson')
+
+
+class BeautifierBatchResource(Resource):
+    def post(self):
+        ''' Исправляет пакет текстов. Результаты отдаются по строке NDJSON на текст в порядке запроса '''
+        args = batchParser.parse_args()
+        if len(args['texts']) > MAX_BATCH:
+            abort(413, message=f'Batch must contain at most {MAX_BATCH} texts')
+        return Response(correctBatch(args['texts']), mimetype='application/x-ndjson')
+
+
+def correctBatch(texts):
+    ''' Проверяет тексты пакета параллельно, одинаковые тексты проверяются один раз.
+        Статистика всего пакета записывается в БД одной транзакцией в конце '''
+    remaining = Counter(texts)  # Сколько раз текст ещё встретится, после этого его результат не нужен
+    results = speller.iterMistakes(list(remaining))
+    done = {}
+    counts = Counter()
+    try:
+        for index, text in enumerate(texts):
+            if text not in done:
+                mistakes, error = next(results)
+                if error:
+                    done[text] = ({'message': 'Speller is unavailable'}, [])
+                else:
+                    corrected, tablelist, normals = corrector.enrich(text, mistakes)
+                    done[text] = ({'corrected_text': corrected, 'mistakes': tablelist}, normals)
+            result, normals = done[text]
+            counts.update((normal, langAcronym, None) for normal, langAcronym in normals)
+            remaining[text] -= 1
+            if not remaining[text]:
+                del done[text]
+            yield json.dumps({'index': index, **result}, ensure_ascii=False) + '\n'
+    finally:
+        results.close()
+        statistics.recordCounts(counts)
+
+
+def readText(stream):
+    ''' Читает документ блоками и декодирует его из UTF-8 '''
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        yield decoder.decode(data)
+    yield decoder.decode(b'', final=True)
+
+
+def correctStream(pieces):
+    ''' Делит поток текста на окна по границам предложений и исправляет их по очереди.
+        Следующие окна проверяются спеллером, пока исправляется текущее.
+        Позиции ошибок даются в координатах всего документа, статистика пишется по окнам '''
+    windows = deque()
+
+    def texts():
+        for offset, window in speller.iterWindows(pieces):
+            windows.append((offset, window))
+            yield window
+
+    results = speller.iterMistakes(texts(), STREAM_AHEAD)
+    try:
+        for mistakes, error in results:
+            offset, window = windows.popleft()
+            if error:
+                yield json.dumps({'offset': offset, 'message': 'Speller is unavailable'}) + '\n'
+                return
+            corrected, tablelist, normals = corrector.enrich(window, mistakes)
+            for item in tablelist:
+                item['pos'] += offset
+            statistics.record(normals)
+            yield json.dumps({'offset': offset, 'corrected_text': corrected, 'mistakes': tablelist},
+                             ensure_ascii=False) + '\n'
+    finally:
+        results.close()
@@ -2,3 +2,12 @@ from flask_restful import reqparse
 
 parser = reqparse.RequestParser()
 parser.add_argument('token', required=False)
+parser.add_argument('lang', required=False)  # Только ошибки этого языка
+parser.add_argument('top', type=int, required=False)  # Столько самых частых ошибок
+parser.add_argument('limit', type=int, required=False)  # Размер страницы при постраничной выдаче
+parser.add_argument('after', required=False)  # Курсор из поля next предыдущей страницы
+
+exportParser = reqparse.RequestParser()
+exportParser.add_argument('token', required=False)  # Только ошибки этого пользователя
+exportParser.add_argument('lang', required=False)
+exportParser.add_argument('format', choices=['csv', 'ndjson'], default='ndjson')
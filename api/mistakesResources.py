@@ -1,31 +1,95 @@
-from flask import jsonify
+from flask import jsonify, Response
 from flask_restful import abort, Resource
+from sqlalchemy import and_, or_
 from data import dbSession
 from data.users import User
 from data.mistakes import Mistake
 from data.languages import Language
-from .mistakesParser import parser
+from data.association import Association
+from modules import responseCache, statistics, export
+from .mistakesParser import parser, exportParser
+
+MAX_PAGE = 1000  # Максимальный размер страницы
 
 
 class MistakesResouce(Resource):
     def get(self):
         args = parser.parse_args()
-        session = dbSession.createSession()
-        tablelist = []
+        userId = None
         if args['token']:
-            user = session.query(User).filter(User.token == args['token']).first()
+            user = dbSession.getSession().query(User.id).filter(User.token == args['token']).first()
             if not user:
                 abort(404, message='Wrong token')
-            for association in user.mistakes:
-                mistake = session.query(Mistake).get(association.mistake)
-                lang = session.query(Language).get(mistake.language)
-                tablelist.append({'name': mistake.name,
-                                  'count': association.count,
-                                  'lang': lang.acronym})
+            userId = user.id
+        scope = statistics.userScope(userId) if userId else statistics.GLOBAL
+        return responseCache.cachedResponse(lambda: buildMistakes(args, userId), scope,
+                                            sorted(args.items()))
+
+
+class MistakesExportResource(Resource):
+    def get(self):
+        ''' Выгрузка ошибок в CSV или NDJSON. С токеном выгружаются ошибки его владельца
+            с его счётчиками, без токена - только общие счётчики без данных пользователей.
+            Выгрузка по всем пользователям доступна только командой flask export-mistakes '''
+        args = exportParser.parse_args()
+        userId = None
+        if args['token']:
+            user = dbSession.getSession().query(User.id).filter(User.token == args['token']).first()
+            if not user:
+                abort(404, message='Wrong token')
+            userId = user.id
+        fmt = args['format']
+        mimetype = 'text/csv' if fmt == export.CSV else 'application/x-ndjson'
+        pieces = export.export(fmt, args['lang'], userId, perUser=userId is not None)
+        return Response(pieces, mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename=mistakes.{fmt}'})
+
+
+def mistakesQuery(session, args, userId):
+    ''' Запрос страницы ошибок: id, имя, количество и язык в порядке выдачи '''
+    if userId:
+        # Для пользователя количество берётся из ассоциативной БД
+        count = Association.count
+        query = session.query(Mistake.id, Mistake.name, count, Language.acronym) \
+            .join(Association, Association.mistake == Mistake.id) \
+            .filter(Association.user == userId)
+    else:
+        count = Mistake.count
+        query = session.query(Mistake.id, Mistake.name, count, Language.acronym)
+    query = query.outerjoin(Language, Language.id == Mistake.language)
+    if args['lang']:
+        query = query.filter(Language.acronym == args['lang'])
+    size = args['top'] or args['limit']
+    if size is not None and not 0 < size <= MAX_PAGE:
+        abort(400, message=f'Page size must be between 1 and {MAX_PAGE}')
+    # Постраничная выдача по ключу: по количеству при top, иначе по id
+    try:
+        if args['top']:
+            query = query.order_by(count.desc(), Mistake.id)
+            if args['after']:
+                lastCount, lastId = map(int, args['after'].split(':'))
+                query = query.filter(or_(count < lastCount,
+                                         and_(count == lastCount, Mistake.id > lastId)))
         else:
-            for mistake in session.query(Mistake).all():
-                lang = session.query(Language).get(mistake.language)
-                tablelist.append({'name': mistake.name,
-                                  'count': mistake.count,
-                                  'lang': lang.acronym})
-        return jsonify({'mistakes': tablelist})
+            query = query.order_by(Mistake.id)
+            if args['after']:
+                query = query.filter(Mistake.id > int(args['after']))
+    except ValueError:
+        abort(400, message='Wrong cursor')
+    if size:
+        query = query.limit(size)
+    return query
+
+
+def buildMistakes(args, userId):
+    ''' Страница ошибок всех пользователей или пользователя userId '''
+    rows = mistakesQuery(dbSession.getSession(), args, userId).all()
+    size = args['top'] or args['limit']
+    result = {'mistakes': [{'name': name, 'count': amount, 'lang': acronym}
+                           for _, name, amount, acronym in rows]}
+    if size:
+        result['next'] = None
+        if len(rows) == size:
+            lastId, _, lastCount, _ = rows[-1]
+            result['next'] = f'{lastCount}:{lastId}' if args['top'] else str(lastId)
+    return jsonify(result)
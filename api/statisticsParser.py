@@ -1,4 +1,21 @@
+from datetime import datetime, timezone
 from flask_restful import reqparse
 
+
+def timestamp(value):
+    ''' Время в секундах с начала эпохи или в формате ISO 8601. Время без часового пояса - UTC '''
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
 parser = reqparse.RequestParser()
-parser.add_argument('type', choices=['age', 'lang'], required=True)
+parser.add_argument('type', choices=['age', 'lang', 'top'], required=True)
+parser.add_argument('since', type=timestamp, required=False)  # Начало периода
+parser.add_argument('until', type=timestamp, required=False)  # Конец периода, по умолчанию - сейчас
+parser.add_argument('limit', type=int, default=10)  # Число ошибок для type=top
@@ -1,30 +1,52 @@
 from flask import jsonify
 from flask_restful import abort, Resource
 from data import dbSession
-from data.users import User
 from data.mistakes import Mistake
 from data.languages import Language
+from data.languageStats import LanguageStat
+from data.ageStats import AgeStat
+from modules import responseCache, trends
 from .statisticsParser import parser
-from collections import defaultdict
+import time
+
+MAX_TOP = 1000  # Максимальное число ошибок для type=top
 
 
 class StatisticsResource(Resource):
     def get(self):
         args = parser.parse_args()
-        session = dbSession.createSession()
-        tablelist = []
-        if args['type'] == 'age':
-            ages = defaultdict(int)
-            for user in session.query(User).all():
-                for mistake in user.mistakes:
-                    ages[user.age] += mistake.count
-            for item in ages.items():
-                tablelist.append({item[0]: item[1]})
-        elif args['type'] == 'lang':
-            langs = defaultdict(int)
-            for mistake in session.query(Mistake).all():
-                language = session.query(Language).get(mistake.language)
-                langs[language.acronym] += mistake.count
-            for item in langs.items():
-                tablelist.append({item[0]: item[1]})
-        return jsonify({'statistics': tablelist})
+        if not 0 < args['limit'] <= MAX_TOP:
+            abort(400, message=f'Limit must be between 1 and {MAX_TOP}')
+        return responseCache.cachedResponse(lambda: buildStatistics(args),
+                                            key=(args['type'], args['since'], args['until'], args['limit']))
+
+
+def buildStatistics(args):
+    ''' Статистика по возрасту, по языкам или самые частые ошибки.
+        С параметрами since и until - за период, по сводкам журнала ошибок '''
+    session = dbSession.getSession()
+    statType = args['type']
+    if args['since'] is not None or args['until'] is not None:
+        since = args['since'] or 0
+        until = args['until'] if args['until'] is not None else int(time.time()) + 1
+        if statType == 'age':
+            items = sorted(trends.ages(session, since, until).items())
+        elif statType == 'lang':
+            items = trends.languages(session, since, until).most_common()
+        else:
+            items = trends.top(session, since, until, args['limit'])
+        return jsonify({'statistics': [{key: count} for key, count in items]})
+    tablelist = []
+    # Статистика читается из сводных таблиц, которые обновляются вместе со счётчиками ошибок
+    if statType == 'age':
+        for stat in session.query(AgeStat).order_by(AgeStat.age):
+            tablelist.append({stat.age: stat.count})
+    elif statType == 'lang':
+        for acronym, count in session.query(Language.acronym, LanguageStat.count) \
+                .join(LanguageStat, LanguageStat.language == Language.id):
+            tablelist.append({acronym: count})
+    else:
+        for name, count in session.query(Mistake.name, Mistake.count) \
+                .order_by(Mistake.count.desc(), Mistake.id).limit(args['limit']):
+            tablelist.append({name: count})
+    return jsonify({'statistics': tablelist})
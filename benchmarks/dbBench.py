@@ -0,0 +1,91 @@
+''' Нагрузочный тест БД: несколько процессов одновременно читают статистику и пишут счётчики.
+    Сравнивает настройки SQLite по умолчанию с настройками dbSession.ENGINE_OPTIONS.
+    Запуск из корня репозитория: python -m benchmarks.dbBench --workers 4 --seconds 5 '''
+
+from collections import Counter
+from multiprocessing import Pool
+import argparse
+import os
+import random
+import tempfile
+import time
+
+PROFILES = {
+    # Настройки, с которыми БД работала раньше: журнал отката и значения SQLite по умолчанию
+    'rollback': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000,
+                 'cache_size': -2000},
+    'wal': {},
+}
+
+
+def worker(task):
+    ''' Выполняет смешанную нагрузку и возвращает число чтений, записей и ошибок блокировки '''
+    path, options, seconds, writeRatio, seed = task
+    from sqlalchemy.exc import OperationalError
+    from data import dbSession
+    from data.mistakes import Mistake
+    from data.languages import Language
+    from data.languageStats import LanguageStat
+    from modules import statistics
+    dbSession.globalInit(path, **options)
+    rand = random.Random(seed)
+    done = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if rand.random() < writeRatio:
+                statistics.write(Counter({(f'слово{rand.randrange(1000)}', 'ru', rand.randint(1, 50)): 1
+                                          for _ in range(10)}))
+                done['writes'] += 1
+            else:
+                session = dbSession.getSession()
+                session.query(Mistake.name, Mistake.count).order_by(Mistake.count.desc()).limit(10).all()
+                session.query(Language.acronym, LanguageStat.count) \
+                    .join(LanguageStat, LanguageStat.language == Language.id).all()
+                dbSession.removeSession()
+                done['reads'] += 1
+        except OperationalError:
+            dbSession.removeSession()
+            done['locked'] += 1
+    return done
+
+
+def prepare(path, options):
+    ''' Создаёт БД с пользователями для записи ассоциаций '''
+    import sqlite3
+    task = (path, options, 0, 0, 0)
+    with Pool(1) as pool:
+        pool.map(worker, [task])  # Создание схемы в отдельном процессе
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO users (name, age, token) VALUES (?, ?, ?)',
+                     [(f'user{i}', 18 + i % 50, f'token{i}') for i in range(50)])
+    conn.commit()
+    conn.close()
+
+
+def run(profile, workers, seconds, writeRatio):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.db')
+    prepare(path, PROFILES[profile])
+    tasks = [(path, PROFILES[profile], seconds, writeRatio, seed) for seed in range(workers)]
+    with Pool(workers) as pool:
+        results = pool.map(worker, tasks)
+    total = sum(results, Counter())
+    print(f"{profile:>10}: {(total['reads'] + total['writes']) / seconds:8.1f} оп/с, "
+          f"чтений {total['reads']}, записей {total['writes']}, "
+          f"ошибок блокировки {total['locked']}")
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--workers', type=int, default=4)
+    argParser.add_argument('--seconds', type=float, default=5)
+    argParser.add_argument('--write-ratio', type=float, default=0.2, help='Доля операций записи')
+    args = argParser.parse_args()
+    print(f'Процессов: {args.workers}, доля записи: {args.write_ratio}')
+    for profile in PROFILES:
+        run(profile, args.workers, args.seconds, args.write_ratio)
+
+
+if __name__ == '__main__':
+    main()
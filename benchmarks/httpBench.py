@@ -0,0 +1,172 @@
+''' Задержка и пропускная способность основных страниц и API без внешних сервисов.
+    Спеллер заменяется HTTP-заглушкой из benchmarks.stubs с задержкой --latency плюс --per-kb
+    на килобайт текста, запасное определение языка - заглушкой с задержкой --translator-latency.
+    Запросы выполняются тестовым клиентом Flask в --concurrency потоках над копией БД,
+    поэтому исходная БД не меняется. Без --db БД создаётся benchmarks.makeDb с параметрами
+    --users, --lemmas и --associations. Для каждого адреса выводятся число запросов, ошибок,
+    запросов в секунду и перцентили задержки.
+    Запуск из корня репозитория: python -m benchmarks.httpBench --requests 200 --concurrency 4 '''
+
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks import makeDb
+from benchmarks.stubs import makeCorpus, startSpeller, translatorStub
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+WEEK = 7 * 24 * 60 * 60
+ENDPOINTS = ('/', '/result', '/api/beautifier', '/api/mistakes', '/api/statistics', '/stats')
+# flask_googlecharts хранит диаграммы запроса в общем объекте, поэтому страницы с диаграммами
+# проверяются в одном потоке, как в синхронном рабочем процессе gunicorn
+SERIAL = ('/stats',)
+
+
+class Scenarios:
+    ''' Запросы к каждому адресу. Методы получают тестовый клиент и генератор случайных чисел
+        и возвращают ответ. Тексты и токены выбираются случайно, id результатов
+        берутся из ответов на отправку формы '''
+
+    def __init__(self, texts, tokens):
+        self.texts = texts
+        self.tokens = tokens
+        self.results = []
+
+    def main(self, client, rand):
+        response = client.post('/', data={'text': rand.choice(self.texts)})
+        if response.status_code == 302:
+            self.results.append(response.headers['Location'].rsplit('/', 1)[-1])
+        return response
+
+    def result(self, client, rand):
+        return client.get(f'/result/{rand.choice(self.results)}')
+
+    def beautifier(self, client, rand):
+        return client.get('/api/beautifier', json={'text': rand.choice(self.texts)})
+
+    def mistakes(self, client, rand):
+        query = rand.choice([{'top': 10}, {'top': 10, 'lang': 'ru'}, {'limit': 100},
+                             {'limit': 100, 'token': rand.choice(self.tokens)}])
+        return client.get('/api/mistakes', json=query)
+
+    def statistics(self, client, rand):
+        query = {'type': rand.choice(['lang', 'age', 'top'])}
+        if rand.random() < 0.5:
+            query['since'] = int(time.time()) - WEEK
+        return client.get('/api/statistics', json=query)
+
+    def stats(self, client, rand):
+        return client.get('/stats')
+
+    def get(self, endpoint):
+        return {'/': self.main, '/result': self.result, '/api/beautifier': self.beautifier,
+                '/api/mistakes': self.mistakes, '/api/statistics': self.statistics,
+                '/stats': self.stats}[endpoint]
+
+
+def percentile(values, share):
+    ''' Перцентиль share отсортированного списка values '''
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def measure(app, scenario, requests, concurrency, clearCache, seed):
+    ''' Выполняет requests запросов в concurrency потоках.
+        Возвращает отсортированные задержки, число ошибок и общее время '''
+    from modules import responseCache
+    local = threading.local()
+    seeds = iter(range(seed, seed + concurrency))
+    lock = threading.Lock()
+
+    def call(_):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            with lock:
+                local.rand = random.Random(next(seeds))
+        if clearCache:
+            responseCache.clear()
+        started = time.perf_counter()
+        response = scenario(local.client, local.rand)
+        elapsed = time.perf_counter() - started
+        response.close()
+        return elapsed, response.status_code >= 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    total = time.perf_counter() - started
+    return sorted(elapsed for elapsed, _ in results), sum(failed for _, failed in results), total
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--db', help='готовая БД, по умолчанию создаётся новая')
+    argParser.add_argument('--users', type=int, default=1000)
+    argParser.add_argument('--lemmas', type=int, default=20000)
+    argParser.add_argument('--associations', type=int, default=100000)
+    argParser.add_argument('--requests', type=int, default=200, help='запросов к каждому адресу')
+    argParser.add_argument('--warmup', type=int, default=10, help='запросов до начала замеров')
+    argParser.add_argument('--concurrency', type=int, default=4, help='число потоков')
+    argParser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+    argParser.add_argument('--paragraphs', type=int, default=5, help='абзацев в тексте')
+    argParser.add_argument('--latency', type=float, default=0.05, help='задержка заглушки спеллера в секундах')
+    argParser.add_argument('--per-kb', type=float, default=0.005, help='задержка заглушки спеллера на килобайт')
+    argParser.add_argument('--translator-latency', type=float, default=0.05,
+                           help='задержка заглушки переводчика в секундах')
+    argParser.add_argument('--speller-cache', action='store_true', help='не отключать кэш ответов спеллера')
+    argParser.add_argument('--prefilter', action='store_true', help='включить фильтр по словарю')
+    argParser.add_argument('--no-response-cache', action='store_true',
+                           help='очищать кэш ответов статистики перед каждым запросом')
+    argParser.add_argument('--seed', type=int, default=1)
+    args = argParser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'ortho.db')
+        if args.db:
+            shutil.copy(args.db, path)
+        else:
+            makeDb.generate(path, args.users, args.lemmas, args.associations, seed=args.seed)
+        with sqlite3.connect(path) as conn:
+            tokens = [token for token, in conn.execute('SELECT token FROM users WHERE token IS NOT NULL LIMIT 1000')]
+            rows = {table: conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+                    for table in ('users', 'mistakes', 'association')}
+        texts, typos = makeCorpus(100, args.paragraphs, 0.03, args.seed)
+        server = startSpeller(typos, args.latency, args.per_kb)
+
+        import flask_app
+        from modules import speller, translator
+        app = flask_app.createApp(DB_FILE=path, RESULT_STORE=os.path.join(directory, 'results.db'),
+                                  SPELLER_PREFILTER=args.prefilter, WTF_CSRF_ENABLED=False)
+        speller.setBackend(speller.HttpBackend(f'http://127.0.0.1:{server.server_port}/'))
+        if not args.speller_cache:
+            speller.setCache(None)
+        translator.setFallback(translatorStub(args.translator_latency))
+
+        print(f"Пользователей: {rows['users']}, ошибок: {rows['mistakes']}, связей: {rows['association']}, "
+              f'потоков: {args.concurrency}, запросов к адресу: {args.requests}')
+        print(f"{'адрес':<16} {'потоков':>7} {'запросов':>8} {'ошибок':>7} {'запр/с':>8} "
+              f"{'p50, мс':>9} {'p90, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+        scenarios = Scenarios(texts, tokens or [''])
+        if '/result' in args.endpoints and '/' not in args.endpoints:
+            measure(app, scenarios.main, args.concurrency, args.concurrency, False, args.seed)
+        for endpoint in ENDPOINTS:
+            if endpoint not in args.endpoints:
+                continue
+            scenario = scenarios.get(endpoint)
+            threads = 1 if endpoint in SERIAL else args.concurrency
+            measure(app, scenario, args.warmup, threads, args.no_response_cache, args.seed)
+            times, errors, total = measure(app, scenario, args.requests, threads, args.no_response_cache, args.seed)
+            print(f'{endpoint:<16} {threads:7d} {len(times):8d} {errors:7d} {len(times) / total:8.1f} '
+                  + ' '.join(f'{percentile(times, share) * 1000:9.1f}' for share in (0.5, 0.9, 0.99))
+                  + f' {times[-1] * 1000:9.1f}')
+        server.shutdown()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+''' Генератор синтетической БД ortho.db для нагрузочных тестов.
+    Создаёт пользователей, начальные формы ошибок и связи пользователей с ошибками,
+    частоты ошибок распределены по закону Ципфа. Сводные таблицы пересчитываются
+    через statistics.rebuild, почасовые и суточные сводки заполняются за последние --days суток.
+    У пользователя с номером i токен bench<i>, почта user<i>@example.com и пароль password.
+    Запуск из корня репозитория:
+    python -m benchmarks.makeDb --users 100000 --lemmas 1000000 --associations 5000000 --output /tmp/ortho.db '''
+
+from itertools import accumulate
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+LANGUAGES = ('ru', 'uk', 'en')
+LANGUAGE_WEIGHTS = (0.8, 0.1, 0.1)
+SYLLABLES = {
+    'ru': ['ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ло', 'ме', 'на', 'по', 'ру', 'ст', 'ти', 'хо', 'ще'],
+    'uk': ['бі', 'ві', 'ґа', 'де', 'є', 'жи', 'зі', 'ї', 'ку', 'лі', 'ми', 'ні', 'пі', 'ри', 'ті', 'чі'],
+    'en': ['ba', 'ce', 'di', 'fo', 'gu', 'he', 'ki', 'lo', 'me', 'ni', 'po', 'ra', 'se', 'ti', 'vo', 'wy'],
+}
+PASSWORD = 'password'
+BATCH_SIZE = 10000  # Сколько строк вставляется за один executemany
+ROLLUP_MISTAKES = 200  # Сколько разных ошибок попадает в сводку за один час или сутки
+
+
+def lemma(lang, number):
+    ''' Уникальное для языка слово из слогов, записанное по номеру в системе счисления по числу слогов '''
+    syllables = SYLLABLES[lang]
+    parts = []
+    number += len(syllables)  # Не меньше двух слогов
+    while number:
+        number, digit = divmod(number, len(syllables))
+        parts.append(syllables[digit])
+    return ''.join(parts)
+
+
+def zipfWeights(count, exponent=1.1):
+    ''' Накопленные веса для random.choices: ошибка с номером k встречается в k^exponent раз реже первой '''
+    return list(accumulate(1 / (k ** exponent) for k in range(1, count + 1)))
+
+
+def batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(conn, sql, rows):
+    for batch in batches(rows):
+        conn.executemany(sql, batch)
+
+
+def generate(path, users, lemmas, associations, days=30, seed=1):
+    ''' Создаёт БД в файле path. Возвращает число строк в основных таблицах '''
+    from werkzeug.security import generate_password_hash
+    from data import dbSession
+    from data.mistakeEvents import NO_AGE
+    from modules import statistics
+    from modules.statistics import HOUR, DAY
+    dbSession.globalInit(path)  # Схема и миграции создаются так же, как при запуске сайта
+    dbSession.dispose()
+    rand = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA synchronous=OFF')
+    languageIds = {}
+    for lang in LANGUAGES:
+        conn.execute('INSERT OR IGNORE INTO languages (acronym) VALUES (?)', (lang,))
+        languageIds[lang] = conn.execute('SELECT id FROM languages WHERE acronym = ?', (lang,)).fetchone()[0]
+    # Пароль у всех пользователей одинаковый, хэш считается один раз
+    hashed = generate_password_hash(PASSWORD)
+    ages = [rand.choice([None] + list(range(7, 80))) for _ in range(users)]
+    userStart = conn.execute('SELECT coalesce(max(id), 0) FROM users').fetchone()[0] + 1
+    insert(conn, 'INSERT INTO users (id, surname, name, age, email, hashedPassword, token) '
+                 'VALUES (?, ?, ?, ?, ?, ?, ?)',
+           ((userStart + i, f'Surname{i}', f'User{i}', ages[i], f'user{i}@example.com', hashed, f'bench{i}')
+            for i in range(users)))
+    mistakeStart = conn.execute('SELECT coalesce(max(id), 0) FROM mistakes').fetchone()[0] + 1
+    langs = rand.choices(LANGUAGES, LANGUAGE_WEIGHTS, k=lemmas)
+    numbers = dict.fromkeys(LANGUAGES, 0)
+
+    def mistakeRows():
+        for i, lang in enumerate(langs):
+            numbers[lang] += 1
+            yield mistakeStart + i, lemma(lang, numbers[lang]), 0, languageIds[lang]
+
+    insert(conn, 'INSERT INTO mistakes (id, name, count, language) VALUES (?, ?, ?, ?)', mistakeRows())
+    # Связи: у каждого пользователя свой набор разных ошибок, частые ошибки выбираются чаще
+    weights = zipfWeights(lemmas)
+    counts = [0] * lemmas
+    perUser = associations / users if users else 0
+    made = 0
+
+    def associationRows():
+        nonlocal made
+        for user in range(users):
+            want = min(lemmas, int(perUser * (user + 1)) - int(perUser * user))
+            chosen = set(rand.choices(range(lemmas), cum_weights=weights, k=want))
+            while len(chosen) < want:  # Повторы частых ошибок заменяются случайными
+                chosen.add(rand.randrange(lemmas))
+            for mistake in chosen:
+                count = int(rand.paretovariate(2))
+                counts[mistake] += count
+                made += 1
+                yield userStart + user, mistakeStart + mistake, count
+
+    insert(conn, 'INSERT INTO association (user, mistake, count) VALUES (?, ?, ?)', associationRows())
+    # Ошибки анонимных пользователей учитываются только в общем счётчике
+    for mistake in rand.choices(range(lemmas), cum_weights=weights, k=associations // 2) if lemmas else ():
+        counts[mistake] += 1
+    insert(conn, 'UPDATE mistakes SET count = ? WHERE id = ?',
+           ((count, mistakeStart + i) for i, count in enumerate(counts) if count))
+    # Сводки за период: почасовые за последние двое суток, суточные за days суток
+    now = int(time.time())
+    rollupAges = [age for age in set(ages) if age is not None] + [NO_AGE]
+
+    def rollupRows(first, last):
+        for period in range(first, last):
+            rows = {}
+            for mistake in rand.choices(range(lemmas), cum_weights=weights, k=ROLLUP_MISTAKES) if lemmas else ():
+                key = (period, mistakeStart + mistake, rand.choice(rollupAges))
+                rows[key] = rows.get(key, 0) + rand.randint(1, 5)
+            yield from (key + (count,) for key, count in rows.items())
+
+    insert(conn, 'INSERT INTO hourly_stats (period, mistake, age, count) VALUES (?, ?, ?, ?)',
+           rollupRows(now // HOUR - 2 * DAY // HOUR, now // HOUR + 1))
+    insert(conn, 'INSERT INTO daily_stats (period, mistake, age, count) VALUES (?, ?, ?, ?)',
+           rollupRows(now // DAY - days, now // DAY + 1))
+    conn.commit()
+    conn.close()
+    statistics.rebuild()
+    return {'users': users, 'mistakes': lemmas, 'associations': made}
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--users', type=int, default=10000, help='число пользователей')
+    argParser.add_argument('--lemmas', type=int, default=100000, help='число разных ошибок')
+    argParser.add_argument('--associations', type=int, default=500000, help='число связей пользователей с ошибками')
+    argParser.add_argument('--days', type=int, default=30, help='за сколько суток заполнить суточные сводки')
+    argParser.add_argument('--seed', type=int, default=1)
+    argParser.add_argument('--output', required=True, help='файл новой БД')
+    args = argParser.parse_args()
+    if os.path.exists(args.output):
+        argParser.error(f'файл {args.output} уже существует')
+    started = time.perf_counter()
+    rows = generate(args.output, args.users, args.lemmas, args.associations, args.days, args.seed)
+    print(f"Пользователей: {rows['users']}, ошибок: {rows['mistakes']}, связей: {rows['associations']}, "
+          f'размер: {os.path.getsize(args.output) / 2 ** 20:.1f} МБ, '
+          f'время: {time.perf_counter() - started:.1f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+''' Сравнение проверки текста с предварительным фильтром по словарю и без него.
+    Показывает объём отправленного в спеллер текста, задержку и полноту: долю ошибок
+    полной проверки, которые нашлись и с фильтром.
+    По умолчанию спеллер заменяется локальной заглушкой, которая отмечает слова с опечатками
+    и отвечает с задержкой --latency плюс --per-kb на каждый килобайт текста.
+    Запуск из корня репозитория: python -m benchmarks.prefilterBench --texts 50 '''
+
+from benchmarks.stubs import makeCorpus, startSpeller
+import argparse
+import statistics as stats
+import threading
+import time
+
+
+class CountingBackend:
+    ''' Считает запросы и байты, отправленные в спеллер '''
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.requests = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def check(self, text):
+        with self.lock:
+            self.requests += 1
+            self.bytes += len(text.encode())
+        return self.backend.check(text)
+
+
+def run(texts, url, prefilter):
+    from modules import speller
+    backend = CountingBackend(speller.HttpBackend(url))
+    speller.setBackend(backend)
+    speller.setCache(None)
+    speller.setPrefilter(prefilter)
+    found = set()
+    times = []
+    for index, text in enumerate(texts):
+        started = time.perf_counter()
+        mistakes = speller.getMistakes(text)
+        times.append(time.perf_counter() - started)
+        found.update((index, m['pos'], m['word']) for m in mistakes)
+    return backend, times, found
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--texts', type=int, default=50, help='число текстов')
+    argParser.add_argument('--paragraphs', type=int, default=20, help='абзацев в тексте')
+    argParser.add_argument('--rate', type=float, default=0.03, help='доля слов с опечатками')
+    argParser.add_argument('--url', help='адрес спеллера вместо заглушки')
+    argParser.add_argument('--latency', type=float, default=0.05, help='задержка заглушки в секундах')
+    argParser.add_argument('--per-kb', type=float, default=0.005, help='задержка заглушки на килобайт')
+    argParser.add_argument('--seed', type=int, default=1)
+    args = argParser.parse_args()
+
+    from modules import morphology
+    morphology.getMorph()  # Словари загружаются заранее, чтобы не попасть в замеры
+    texts, typos = makeCorpus(args.texts, args.paragraphs, args.rate, args.seed)
+    server = None
+    url = args.url
+    if url is None:
+        server = startSpeller(typos, args.latency, args.per_kb)
+        url = f'http://127.0.0.1:{server.server_port}/'
+    size = sum(len(text.encode()) for text in texts)
+    print(f'Текстов: {len(texts)}, объём: {size / 1024:.1f} КБ, опечаток: {len(typos)}')
+    results = {}
+    for name, enabled in (('без фильтра', False), ('с фильтром', True)):
+        backend, times, found = run(texts, url, enabled)
+        results[name] = found
+        print(f'{name:>12}: {backend.bytes / 1024:8.1f} КБ, {backend.requests:4d} запросов, '
+              f'задержка {stats.mean(times) * 1000:7.1f} мс в среднем, '
+              f'{sorted(times)[int(len(times) * 0.95) - 1] * 1000:7.1f} мс p95')
+    full, filtered = results['без фильтра'], results['с фильтром']
+    recall = len(full & filtered) / len(full) if full else 1.0
+    print(f'Полнота: {recall:.3f} ({len(full & filtered)} из {len(full)}), '
+          f'лишних ошибок: {len(filtered - full)}')
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+''' Время запуска и память рабочих процессов gunicorn.
+    Холодный старт: время импорта flask_app, createApp и первой начальной формы в новом процессе.
+    Память: gunicorn запускается с preload_app и без него, для каждого рабочего процесса
+    выводятся RSS, PSS (RSS с долей общих страниц) и частная память из /proc/<pid>/smaps_rollup.
+    Работает только в Linux. Запуск из корня репозитория: python -m benchmarks.startupBench --workers 4 '''
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+COLD_START = '''
+import json, time
+started = time.perf_counter()
+import flask_app
+imported = time.perf_counter()
+flask_app.createApp(DB_FILE={db!r}, RESULT_STORE=None, PRELOAD={preload})
+created = time.perf_counter()
+from modules import morphology
+morphology.normalForm('проверки')
+print(json.dumps({{'import': imported - started, 'createApp': created - imported,
+                  'firstWord': time.perf_counter() - created}}))
+'''
+
+
+def coldStart(db, preload, runs):
+    ''' Медианы времени этапов запуска по runs новым процессам '''
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', COLD_START.format(db=db, preload=preload)],
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: sorted(result[key] for result in results)[len(results) // 2] for key in results[0]}
+
+
+def freePort():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory(pid):
+    ''' RSS, PSS и частная память процесса в мегабайтах '''
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss': values['Rss'], 'pss': values['Pss'],
+            'private': values['Private_Clean'] + values['Private_Dirty']}
+
+
+def children(pid):
+    found = []
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as file:
+                    if int(file.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        found.append(int(name))
+            except (OSError, IndexError):
+                pass
+    return found
+
+
+def gunicorn(db, preload, workers, timeout=120):
+    ''' Запускает gunicorn, ждёт готовности всех рабочих процессов и замеряет их память '''
+    port = freePort()
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0')
+    command = [sys.executable, '-m', 'gunicorn.app.wsgiapp', '-c', 'gunicorn.conf.py',
+               '-w', str(workers), '-b', f'127.0.0.1:{port}', f'flask_app:createApp(DB_FILE={db!r}, RESULT_STORE=None)']
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        while time.perf_counter() - started < timeout:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/stats', timeout=5).read()
+                ready = time.perf_counter() - started
+                break
+            except OSError:
+                time.sleep(0.05)
+        if ready is None:
+            raise RuntimeError('gunicorn не запустился')
+        # Ждём, пока все рабочие процессы загрузят приложение и память перестанет расти
+        previous = None
+        while time.perf_counter() - started < timeout:
+            pids = children(process.pid)
+            current = sum(memory(pid)['rss'] for pid in pids)
+            if len(pids) == workers and previous is not None and abs(current - previous) < 0.5:
+                break
+            previous = current
+            time.sleep(1)
+        return ready, memory(process.pid), [memory(pid) for pid in children(process.pid)]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--workers', type=int, default=4, help='число рабочих процессов gunicorn')
+    argParser.add_argument('--runs', type=int, default=3, help='число запусков для холодного старта')
+    args = argParser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        db = os.path.join(directory, 'ortho.db')
+        shutil.copy('db/ortho.db', db)
+        print('Холодный старт, медиана в секундах:')
+        for preload in (False, True):
+            times = coldStart(db, preload, args.runs)
+            print(f"  PRELOAD={preload!s:5}: импорт {times['import']:.2f}, createApp {times['createApp']:.2f}, "
+                  f"первое слово {times['firstWord']:.3f}")
+        print(f'gunicorn, {args.workers} рабочих процесса, память в МБ:')
+        for preload in (False, True):
+            ready, master, workers = gunicorn(db, preload, args.workers)
+            total = master['pss'] + sum(worker['pss'] for worker in workers)
+            print(f'  preload_app={preload!s:5}: первый ответ через {ready:.2f} с, PSS всех процессов {total:.1f}')
+            for worker in workers:
+                print(f"    рабочий: RSS {worker['rss']:6.1f}, PSS {worker['pss']:6.1f}, "
+                      f"частная {worker['private']:6.1f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+''' Заглушки внешних сервисов и тексты для нагрузочных тестов.
+    Заглушка спеллера - HTTP-сервер, который отмечает слова из заданного набора опечаток
+    и отвечает с задержкой latency секунд плюс perKb на каждый килобайт текста.
+    Заглушка переводчика подключается как запасной способ определения языка '''
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import json
+import random
+import re
+import threading
+import time
+
+PROSE = [
+    'Прогулка по саду была долгой и спокойной. Мы говорили о том, что видели в городе, '
+    'и о людях, которые живут рядом с нами.',
+    'Вечером погода стала холоднее, поэтому мы вернулись домой и пили чай на веранде, '
+    'слушая, как за окном шумит дождь.',
+    'Каждый человек может научиться писать без ошибок, если будет читать больше хороших '
+    'книг и внимательно перечитывать свои тексты.',
+    'Сегодня хорошая погода, а завтра синоптики обещают сильный ветер, поэтому поездку '
+    'за город придётся отложить до выходных.',
+    'Старый палисадник у дома зарос сиренью, и каждую весну соседи останавливаются, '
+    'чтобы полюбоваться её цветами.',
+    'В библиотеке было тихо, только иногда шелестели страницы, и библиотекарь негромко '
+    'отвечал на вопросы посетителей.',
+]
+
+WORD = re.compile(r'[^\W\d_]+')
+VOWELS = 'аеиоуыэюя'
+
+
+def typo(word, rand):
+    ''' Опечатка в слове: перестановка соседних букв или замена гласной '''
+    vowels = [i for i, char in enumerate(word) if char in VOWELS]
+    if vowels and rand.random() < 0.5:
+        i = rand.choice(vowels)
+        return word[:i] + rand.choice(VOWELS.replace(word[i], '')) + word[i + 1:]
+    i = rand.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def makeCorpus(count, paragraphs, rate, seed):
+    ''' Тексты из абзацев PROSE с опечатками в доле rate слов.
+        Возвращает тексты и словарь опечаток с верными словами '''
+    rand = random.Random(seed)
+    texts = []
+    typos = {}
+    for _ in range(count):
+        lines = []
+        for _ in range(paragraphs):
+            def spoil(match):
+                word = match.group()
+                if len(word) < 4 or rand.random() >= rate:
+                    return word
+                wrong = typo(word, rand)
+                typos[wrong] = word
+                return wrong
+            lines.append(WORD.sub(spoil, rand.choice(PROSE)))
+        texts.append('\n'.join(lines))
+    return texts, typos
+
+
+def startSpeller(typos, latency=0.0, perKb=0.0):
+    ''' Заглушка спеллера, которая отмечает слова из typos и предлагает для них верные слова '''
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+            text = parse_qs(body)['text'][0]
+            time.sleep(latency + perKb * len(text.encode()) / 1024)
+            mistakes = [{'code': 1, 'pos': match.start(), 'len': len(match.group()),
+                         'row': text.count('\n', 0, match.start()),
+                         'col': match.start() - text.rfind('\n', 0, match.start()) - 1,
+                         'word': match.group(), 's': [typos[match.group()]]}
+                        for match in WORD.finditer(text) if match.group() in typos]
+            data = json.dumps(mistakes).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def translatorStub(latency=0.0):
+    ''' Запасной способ определения языка для translator.setFallback с задержкой latency секунд.
+        Отвечает так же, как локальное определение '''
+    from modules import translator
+
+    def detect(word):
+        time.sleep(latency)
+        return translator.detect(word)[0]
+    return detect
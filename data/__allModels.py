@@ -2,3 +2,7 @@ from . import users
 from . import mistakes
 from . import languages
 from . import association
+from . import languageStats
+from . import ageStats
+from . import generations
+from . import mistakeEvents
@@ -0,0 +1,25 @@
+from sqlalchemy import Integer, Column
+from .dbSession import SqlAlchemyBase
+from sqlalchemy_serializer import SerializerMixin
+
+
+class AgeStat(SqlAlchemyBase, SerializerMixin):
+    ''' Число ошибок зарегистрированных пользователей по возрасту '''
+    __tablename__ = 'age_stats'
+
+    age = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AgeStat> {self.age} {self.count}'
+
+
+class AgeBucketStat(SqlAlchemyBase, SerializerMixin):
+    ''' Число ошибок зарегистрированных пользователей по десятилетиям возраста '''
+    __tablename__ = 'age_bucket_stats'
+
+    bucket = Column(Integer, primary_key=True, autoincrement=False)  # Возраст // 10
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AgeBucketStat> {self.bucket} {self.count}'
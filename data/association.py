@@ -1,10 +1,11 @@
-from sqlalchemy import orm, Integer, String, Column, Table, ForeignKey
+from sqlalchemy import orm, Integer, String, Column, Table, ForeignKey, Index
 from .dbSession import SqlAlchemyBase
 from sqlalchemy_serializer import SerializerMixin
 
 
 class Association(SqlAlchemyBase, SerializerMixin):
     __tablename__ = 'association'
+    __table_args__ = (Index('ix_association_mistake', 'mistake', 'user'),)
 
     user = Column(Integer, ForeignKey('users.id'), primary_key=True)
     mistake = Column(Integer, ForeignKey('mistakes.id'), primary_key=True)
@@ -2,14 +2,30 @@ import sqlalchemy as sa
 import sqlalchemy.orm as orm
 import sqlalchemy.ext.declarative as dec
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+from modules import metrics
+import time
 
 SqlAlchemyBase = dec.declarative_base()
 
+# Настройки SQLite и пула соединений по умолчанию. WAL позволяет читать во время записи
+ENGINE_OPTIONS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # В режиме WAL данные не теряются при падении процесса
+    'busy_timeout': 5000,  # Сколько миллисекунд ждать снятия блокировки
+    'cache_size': -16000,  # Отрицательное значение - размер кэша страниц в килобайтах
+    'pool_size': 5,
+    'max_overflow': 10,
+}
+
+__engine = None
 __factory = None
+__scoped = None
 
 
-def globalInit(dbFile):
-    global __factory
+def globalInit(dbFile, **options):
+    ''' Подключает БД. options переопределяют значения ENGINE_OPTIONS '''
+    global __engine, __factory, __scoped
 
     if __factory:
         return
@@ -17,17 +33,70 @@ def globalInit(dbFile):
     if not dbFile or not dbFile.strip():
         raise Exception('Необходимо указать файл базы данных')
 
+    settings = {**ENGINE_OPTIONS, **options}
     connStr = f'sqlite:///{dbFile.strip()}?check_same_thread=False'
     print(f'Подключение к базе данных по адресу {connStr}')
 
-    engine = sa.create_engine(connStr, echo=False)
+    engine = sa.create_engine(connStr, echo=False, poolclass=QueuePool,
+                              pool_size=settings['pool_size'], max_overflow=settings['max_overflow'],
+                              connect_args={'timeout': settings['busy_timeout'] / 1000})
+
+    @sa.event.listens_for(engine, 'connect')
+    def setPragmas(connection, record):
+        cursor = connection.cursor()
+        # Ожидание блокировок включается первым, смена журнала может ждать другие процессы
+        cursor.execute(f"PRAGMA busy_timeout={int(settings['busy_timeout'])}")
+        cursor.execute(f"PRAGMA journal_mode={settings['journal_mode']}")
+        cursor.execute(f"PRAGMA synchronous={settings['synchronous']}")
+        cursor.execute(f"PRAGMA cache_size={int(settings['cache_size'])}")
+        cursor.close()
+
+    if metrics.enabled():
+        # Время запросов к SQLite учитывается, только если сбор метрик включён до подключения БД
+        @sa.event.listens_for(engine, 'before_cursor_execute')
+        def queryStarted(connection, cursor, statement, parameters, context, executemany):
+            connection.info.setdefault('queryStarted', []).append(time.perf_counter())
+
+        @sa.event.listens_for(engine, 'after_cursor_execute')
+        def queryFinished(connection, cursor, statement, parameters, context, executemany):
+            metrics.record('sqlite', time.perf_counter() - connection.info['queryStarted'].pop())
+
+        @sa.event.listens_for(engine, 'handle_error')
+        def queryFailed(context):
+            if context.connection is not None and context.connection.info.get('queryStarted'):
+                context.connection.info['queryStarted'].pop()
+
+    __engine = engine
     __factory = orm.sessionmaker(bind=engine)
+    __scoped = orm.scoped_session(__factory)
 
     from . import __allModels
+    from .migrations import migrate
 
     SqlAlchemyBase.metadata.create_all(engine)
+    migrate(engine)
 
 
 def createSession() -> Session:
+    ''' Новая сессия. Её нужно закрыть после использования '''
     global __factory
     return __factory()
+
+
+def getSession() -> Session:
+    ''' Сессия текущего запроса. Закрывается в removeSession по окончании запроса '''
+    global __scoped
+    return __scoped()
+
+
+def removeSession(exception=None):
+    ''' Закрывает сессию текущего запроса '''
+    if __scoped is not None:
+        __scoped.remove()
+
+
+def dispose():
+    ''' Закрывает соединения пула. Вызывается в главном процессе gunicorn перед запуском
+        рабочих процессов, чтобы они не использовали соединения, открытые до fork '''
+    if __engine is not None:
+        __engine.dispose()
@@ -0,0 +1,16 @@
+from sqlalchemy import Integer, Column, String, Float
+from .dbSession import SqlAlchemyBase
+from sqlalchemy_serializer import SerializerMixin
+
+
+class Generation(SqlAlchemyBase, SerializerMixin):
+    ''' Номер версии статистики. Увеличивается при каждой записи счётчиков.
+        scope - global для общей статистики или user:<id> для статистики пользователя '''
+    __tablename__ = 'generations'
+
+    scope = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    changed = Column(Float, nullable=True)  # Время последнего изменения в секундах с начала эпохи
+
+    def __repr__(self):
+        return f'<Generation> {self.scope} {self.value}'
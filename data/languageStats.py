@@ -0,0 +1,14 @@
+from sqlalchemy import Integer, Column, ForeignKey
+from .dbSession import SqlAlchemyBase
+from sqlalchemy_serializer import SerializerMixin
+
+
+class LanguageStat(SqlAlchemyBase, SerializerMixin):
+    ''' Суммарное число ошибок по языкам. Обновляется вместе со счётчиками ошибок '''
+    __tablename__ = 'language_stats'
+
+    language = Column(Integer, ForeignKey('languages.id'), primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LanguageStat> {self.language} {self.count}'
@@ -0,0 +1,26 @@
+''' Миграции схемы существующей БД. create_all создаёт только новые таблицы,
+    поэтому индексы и столбцы для старых таблиц добавляются здесь.
+    Номер последней применённой миграции хранится в PRAGMA user_version '''
+
+MIGRATIONS = [
+    # Индексы для поиска ошибок по имени, сортировки по количеству и фильтра по языку
+    ['CREATE INDEX IF NOT EXISTS ix_mistakes_name ON mistakes (name)',
+     'CREATE INDEX IF NOT EXISTS ix_mistakes_count ON mistakes (count)',
+     'CREATE INDEX IF NOT EXISTS ix_mistakes_language ON mistakes (language)',
+     'CREATE INDEX IF NOT EXISTS ix_users_token ON users (token)'],
+    # Индекс для соединения ошибок с пользователями в порядке ошибок, например при выгрузке
+    ['CREATE INDEX IF NOT EXISTS ix_association_mistake ON association (mistake, user)'],
+    # Индекс для выдачи самых частых ошибок языка. count по убыванию, чтобы порядок
+    # count DESC, id совпадал с порядком индекса, в конце которого SQLite хранит id
+    ['CREATE INDEX IF NOT EXISTS ix_mistakes_language_count ON mistakes (language, count DESC)'],
+]
+
+
+def migrate(engine):
+    ''' Применяет миграции, которые ещё не применялись к этой БД '''
+    with engine.begin() as conn:
+        version = conn.execute('PRAGMA user_version').scalar()
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
@@ -0,0 +1,46 @@
+from sqlalchemy import Integer, Column
+from .dbSession import SqlAlchemyBase
+from sqlalchemy_serializer import SerializerMixin
+
+NO_AGE = -1  # Возраст в сводных таблицах для ошибок анонимных пользователей и пользователей без возраста
+
+
+class MistakeEvent(SqlAlchemyBase, SerializerMixin):
+    ''' Запись журнала ошибок: сколько раз ошибка встретилась у пользователя при одной записи
+        статистики. Журнал только дополняется и очищается по сроку хранения '''
+    __tablename__ = 'mistake_events'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    time = Column(Integer, nullable=False, index=True)  # Секунды с начала эпохи
+    mistake = Column(Integer, nullable=False)
+    user = Column(Integer, nullable=True)
+    count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<MistakeEvent> {self.time} {self.mistake} {self.count}'
+
+
+class HourlyStat(SqlAlchemyBase, SerializerMixin):
+    ''' Число ошибок за час по ошибкам и возрасту пользователей '''
+    __tablename__ = 'hourly_stats'
+
+    period = Column(Integer, primary_key=True, autoincrement=False)  # Номер часа с начала эпохи
+    mistake = Column(Integer, primary_key=True, autoincrement=False)
+    age = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<HourlyStat> {self.period} {self.mistake} {self.age} {self.count}'
+
+
+class DailyStat(SqlAlchemyBase, SerializerMixin):
+    ''' Число ошибок за сутки по ошибкам и возрасту пользователей '''
+    __tablename__ = 'daily_stats'
+
+    period = Column(Integer, primary_key=True, autoincrement=False)  # Номер суток с начала эпохи
+    mistake = Column(Integer, primary_key=True, autoincrement=False)
+    age = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyStat> {self.period} {self.mistake} {self.age} {self.count}'
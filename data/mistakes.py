@@ -1,4 +1,4 @@
-from sqlalchemy import orm, Integer, String, Column, Table, ForeignKey
+from sqlalchemy import orm, Integer, String, Column, Table, ForeignKey, Index, desc
 from .dbSession import SqlAlchemyBase
 from sqlalchemy_serializer import SerializerMixin
 
@@ -7,10 +7,12 @@ class Mistake(SqlAlchemyBase, SerializerMixin):
     __tablename__ = 'mistakes'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String, nullable=True)
-    count = Column(Integer, nullable=True)
-    language = Column(Integer, ForeignKey('languages.id'), nullable=True)
+    name = Column(String, nullable=True, index=True)
+    count = Column(Integer, nullable=True, index=True)
+    language = Column(Integer, ForeignKey('languages.id'), nullable=True, index=True)
     users = orm.relation('Association', back_populates='mistakes')
+    # Выдача top по языку: count по убыванию, при равенстве id по возрастанию без сортировки
+    __table_args__ = (Index('ix_mistakes_language_count', 'language', desc('count')),)
 
     def __repr__(self):
         return f'<Mistake> {self.id} {self.name}>'
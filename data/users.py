@@ -14,7 +14,7 @@ class User(SqlAlchemyBase, UserMixin, SerializerMixin):
     age = Column(Integer, nullable=True)
     email = Column(String, index=True, unique=True, nullable=True)
     hashedPassword = Column(String, nullable=True)
-    token = Column(String, nullable=True)
+    token = Column(String, index=True, nullable=True)
     mistakes = orm.relation('Association', back_populates='users')
 
     def __repr__(self):
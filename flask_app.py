@@ -1,4 +1,5 @@
-from flask import Flask, render_template, redirect, request, make_response, jsonify, url_for
+from flask import Flask, render_template, redirect, request, make_response, jsonify, url_for, abort, g, Response
+from flask import before_render_template, template_rendered
 from flask_wtf import FlaskForm
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_googlecharts import GoogleCharts, PieChart, ColumnChart
@@ -10,25 +11,153 @@ from data import dbSession
 from data.users import User
 from data.mistakes import Mistake
 from data.languages import Language
-from data.association import Association
-from modules import speller, translator
+from data.languageStats import LanguageStat
+from data.ageStats import AgeBucketStat
+from modules import speller, prefilter, translator, corrector, cache, statistics, resultStore, metrics, morphology
+from modules import responseCache, export
 from collections import defaultdict
+from contextlib import redirect_stdout
 from secrets import token_urlsafe
+import click
+import sys
+import time
 from api import mistakesResources, statisticsResources, beautifierResources
-import json
-import copy
-import pymorphy2
-
 app = Flask(__name__)
 app.config['SECRET_KEY'] = token_urlsafe(16)  # Генерируем защитный ключ
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db/ortho.db'
-charts = GoogleCharts(app)  # Инициализируем диаграммы
-api = Api(app)  # Инициализируем API
+app.config['DB_FILE'] = 'db/ortho.db'
+app.config['TRANSLATOR_FALLBACK'] = False  # Уточнять язык через API Яндекс.Переводчика
+app.config['DB_OPTIONS'] = {}  # Настройки SQLite и пула соединений, см. dbSession.ENGINE_OPTIONS
+app.config['SPELLER_CACHE'] = None  # Файл SQLite для кэша ответов спеллера, общего для всех процессов
+app.config['SPELLER_PREFILTER'] = False  # Отправлять в спеллер только слова, которых нет в словаре
+app.config['SPELLER_ALLOWLIST'] = []  # Слова, которые считаются верными без проверки
+# Файл SQLite для результатов проверки. Нужен, если запущено несколько процессов сервера,
+# None - хранить результаты в памяти процесса
+app.config['RESULT_STORE'] = 'db/results.db'
+# Запись статистики: sync - сразу во время запроса, buffered - пачками в фоновом потоке
+app.config['STATS_MODE'] = 'sync'
+app.config['STATS_SPOOL'] = None  # Каталог для копии буфера на диске в режиме buffered
+app.config['STATS_FLUSH_INTERVAL'] = 5  # Период сброса буфера в секундах
+app.config['STATS_FLUSH_SIZE'] = 1000  # Число разных счётчиков, при котором буфер сбрасывается сразу
+app.config['METRICS'] = False  # Собирать время этапов и отдавать его на /metrics и в заголовке Server-Timing
+# Каталог, через который процессы сервера складывают метрики для /metrics, None - каждый процесс отдаёт свои
+app.config['METRICS_DIR'] = 'db/metrics'
+app.config['PRELOAD'] = True  # Загружать словари при создании приложения, а не при первом запросе
+# Диаграммы, API и вход подключаются к приложению в createApp
+charts = GoogleCharts()
+api = Api()
+loginManager = LoginManager()
+app.teardown_appcontext(dbSession.removeSession)  # Сессия БД закрывается по окончании запроса
+__created = False
 
-morph = pymorphy2.MorphAnalyzer()  # Инициализируем модуль морфологии
 
-loginManager = LoginManager()
-loginManager.init_app(app)
+def startMetrics():
+    g.metricsToken = metrics.begin()
+    g.requestStarted = time.perf_counter()
+    metrics.add('ortho_requests_in_flight', 1)
+
+
+def addServerTiming(response):
+    metrics.inc('ortho_requests_total', endpoint=request.endpoint or 'unknown', status=response.status_code)
+    timing = metrics.serverTiming()
+    if timing:
+        response.headers['Server-Timing'] = timing
+    return response
+
+
+def finishMetrics(exception=None):
+    if 'metricsToken' not in g:
+        return
+    metrics.add('ortho_requests_in_flight', -1)
+    metrics.observe('ortho_request_seconds', time.perf_counter() - g.requestStarted,
+                    endpoint=request.endpoint or 'unknown')
+    metrics.end(g.pop('metricsToken'))
+
+
+def renderStarted(sender, template, context, **extra):
+    g.renderStarted = time.perf_counter()
+
+
+def renderFinished(sender, template, context, **extra):
+    if 'renderStarted' in g:
+        metrics.record('render', time.perf_counter() - g.pop('renderStarted'))
+
+
+def cacheMetrics():
+    ''' Размер кэша начальных форм и число попаданий в него '''
+    info = morphology.cacheInfo()
+    return [(f'ortho_morphology_cache_{key}', {}, info[key]) for key in ('size', 'hits', 'misses')]
+
+
+def metricsPage():
+    ''' Метрики процесса в текстовом формате Prometheus '''
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def configureModules():
+    ''' Передаёт настройки из app.config модулям '''
+    if app.config['TRANSLATOR_FALLBACK']:
+        translator.setFallback(translator.yandexLanguage)
+    if app.config['SPELLER_CACHE']:
+        speller.setCache(cache.TieredCache(cache.LRUCache(speller.CACHE_SIZE, speller.CACHE_TTL),
+                                           cache.SqliteCache(app.config['SPELLER_CACHE'],
+                                                             ttl=speller.CACHE_TTL)))
+    if app.config['SPELLER_PREFILTER']:
+        prefilter.setAllowlist(app.config['SPELLER_ALLOWLIST'])
+        speller.setPrefilter(True)
+    if app.config['RESULT_STORE']:
+        resultStore.setStore(cache.SqliteCache(app.config['RESULT_STORE'], resultStore.STORE_SIZE,
+                                               resultStore.STORE_TTL, table='results'))
+    statistics.configure(app.config['STATS_MODE'], app.config['STATS_SPOOL'],
+                         app.config['STATS_FLUSH_INTERVAL'], app.config['STATS_FLUSH_SIZE'])
+    if app.config['METRICS']:
+        # Обработчики подключаются только при включённых метриках, иначе запросы их не вызывают
+        metrics.enable()
+        if app.config['METRICS_DIR']:
+            metrics.setDirectory(app.config['METRICS_DIR'])
+        metrics.addCollector(cacheMetrics)
+        app.before_request(startMetrics)
+        app.after_request(addServerTiming)
+        app.teardown_request(finishMetrics)
+        before_render_template.connect(renderStarted, app)
+        template_rendered.connect(renderFinished, app)
+        app.add_url_rule('/metrics', 'metrics', metricsPage)
+
+
+def preload():
+    ''' Загружает словари pymorphy2 и профили языков. В gunicorn с preload_app это происходит
+        в главном процессе, и рабочие процессы получают их при fork без повторной загрузки '''
+    morphology.getMorph().parse('проверка')
+    translator.getProfiles()
+
+
+def createApp(**config):
+    ''' Создаёт приложение для сервера разработки и для gunicorn:
+        gunicorn -c gunicorn.conf.py "flask_app:createApp()"
+        config переопределяет значения app.config. Повторный вызов возвращает то же приложение,
+        поэтому настройки, отличные от уже применённых, в нём не принимаются '''
+    global __created
+    if __created:
+        changed = sorted(key for key, value in config.items() if app.config.get(key) != value)
+        if changed:
+            raise RuntimeError(f'Приложение уже создано, настройки нельзя изменить: {", ".join(changed)}')
+        return app
+    app.config.update(config)
+    configureModules()
+    charts.init_app(app)
+    loginManager.init_app(app)
+    api.add_resource(mistakesResources.MistakesResouce, '/api/mistakes')
+    api.add_resource(mistakesResources.MistakesExportResource, '/api/mistakes/export')
+    api.add_resource(statisticsResources.StatisticsResource, '/api/statistics')
+    api.add_resource(beautifierResources.BeautifierResource, '/api/beautifier')
+    api.add_resource(beautifierResources.BeautifierBatchResource, '/api/beautifier/batch')
+    api.init_app(app)
+    dbSession.globalInit(app.config['DB_FILE'], **app.config['DB_OPTIONS'])
+    statistics.ensureRollups()
+    if app.config['PRELOAD']:
+        preload()
+    __created = True
+    return app
 
 
 class RegisterForm(FlaskForm):
@@ -58,7 +187,7 @@ class BeautifierForm(FlaskForm):
 
 @loginManager.user_loader
 def loadUser(id):
-    session = dbSession.createSession()
+    session = dbSession.getSession()
     return session.query(User).get(id)
 
 
@@ -69,7 +198,7 @@ def register():
     if form.validate_on_submit():
         if form.password.data != form.passwordRepeat.data:
             return render_template('register.html', title='Register', form=form, message='Different passwords')
-        session = dbSession.createSession()
+        session = dbSession.getSession()
         if session.query(User).filter(User.email == form.email.data).first():
             return render_template('register.html', title='Register', form=form, message='User already exists')
         user = User(email=form.email.data,
@@ -89,7 +218,7 @@ def login():
     ''' Страница входа пользователя '''
     form = LoginForm()
     if form.validate_on_submit():
-        session = dbSession.createSession()
+        session = dbSession.getSession()
         user = session.query(User).filter(User.email == form.email.data).first()
         if user and user.checkPassword(form.password.data):
             login_user(user, remember=form.remember.data)
@@ -117,72 +246,42 @@ def mainPage():
     ''' Базовая страница корректора '''
     form = BeautifierForm()
     if form.validate_on_submit():
-        ''' При запуске корректора данные проверяются Яндекс.Спеллером на ошибки
-            и передаются на страницу отображения результатов проверки в формате json'''
-        data = json.dumps({'text': form.text.data, 'mistakes': speller.getMistakes(form.text.data)})
-        return redirect(url_for('result', data=data))
+        ''' При запуске корректора данные проверяются Яндекс.Спеллером на ошибки,
+            исправляются и сохраняются для страницы отображения результатов проверки '''
+        try:
+            mistakes = speller.getMistakes(form.text.data)
+        except speller.SpellerError:
+            return render_template('main.html', title='Beautifier', form=form,
+                                   message='Speller is unavailable, try again later')
+        userId = current_user.id if current_user.is_authenticated else None
+        corrected, tablelist = corrector.correct(form.text.data, mistakes, userId)
+        return redirect(url_for('result', resultId=resultStore.save(corrected, tablelist)))
     return render_template('main.html', title='Beautifier', form=form)
 
 
-@app.route('/result')
-def result():
-    ''' Страница отображения результатов проверки текста '''
-    data = json.loads(request.args['data'])  # Данные, переданные корректором
-    mistakes = data['mistakes']
-    text = data['text']
-    corrected = copy.copy(text)
-    delta = 0
-    tablelist = []
-    for m in mistakes:
-        correct = m['s'][0]  # Исправленное слово
-        wrong = text[m['pos']:m['pos'] + m['len']]  # Ошибочное слово
-        normal = morph.parse(correct)[0].normal_form  # Исправленное слово в начальной форме
-        # Язык слова. Определяется API Яндекс.Переводчика
-        langAcronym = translator.getLanguage(correct)
-        corrected = corrected[:m['pos'] + delta] + correct + \
-            corrected[m['pos'] + m['len'] + delta:]  # Исправление начального текста
-        # Эта переменная хранит в себе изменение длины текста для правильного корректирования
-        delta += len(correct) - len(wrong)
-        session = dbSession.createSession()
-        language = session.query(Language).filter(Language.acronym == langAcronym).first()
-        if not language:
-            # Если язык незнакомый, добавим его в БД
-            language = Language(acronym=langAcronym)
-            session.add(language)
-        mistake = session.query(Mistake).filter(Mistake.name == normal).first()
-        if not mistake:
-            # Если ошибка незнакомая, добавим ее в БД
-            mistake = Mistake(name=normal, count=0, language=language.id)
-            session.add(mistake)
-        mistake.count += 1
-        if current_user.is_authenticated:
-            # Если пользователь аутентифицирован, то запишем эту ошибку в ассоциативную БД
-            association = session.query(Association).filter(
-                Association.mistake == mistake.id, Association.user == current_user.id).first()
-            if not association:
-                association = Association(mistake=mistake.id, count=0)
-                user = session.query(User).get(current_user.id)
-                user.mistakes.append(association)
-            association.count += 1
-        session.commit()
-        tablelist.append({'wrong': wrong.lower(),
-                          'correct': correct.lower(),
-                          'pos': m['pos'],
-                          'lang': langAcronym})
-    return render_template('result.html', title='Result', text=corrected, tablelist=tablelist)
+@app.route('/result/<resultId>')
+def result(resultId):
+    ''' Страница отображения результатов проверки текста.
+        Результат сохраняется при отправке формы, поэтому обновление страницы ничего не пересчитывает '''
+    data = resultStore.load(resultId)
+    if data is None:
+        abort(404)
+    return render_template('result.html', title='Result', text=data['text'], tablelist=data['tablelist'])
 
 
 @app.route('/stats')
 def globalStats():
-    ''' Страница с глобальной статистикой использования сайта '''
-    session = dbSession.createSession()
-    mistakes = session.query(Mistake).all()
-    tablelist = []
-    for mistake in mistakes:
-        language = session.query(Language).get(mistake.language)
-        tablelist.append({'name': mistake.name,
-                          'count': mistake.count,
-                          'lang': language.acronym})
+    ''' Страница с глобальной статистикой использования сайта.
+        Страница строится заново только после изменения статистики, шапка зависит от пользователя '''
+    userId = current_user.id if current_user.is_authenticated else None
+    return responseCache.cachedResponse(renderGlobalStats, key=userId)
+
+
+def renderGlobalStats():
+    session = dbSession.getSession()
+    tablelist = [{'name': name, 'count': count, 'lang': acronym}
+                 for name, count, acronym in session.query(Mistake.name, Mistake.count, Language.acronym)
+                 .outerjoin(Language, Language.id == Mistake.language)]
     # Круговая диаграмма частоты ошибок в словах
     popularityChart = PieChart('popularity', options={'title': 'Mistakes popularity',
                                                       'height': 400})
@@ -190,27 +289,23 @@ def globalStats():
     popularityChart.add_column('number', 'Count')
     popularityChart.add_rows([[item['name'], item['count']] for item in tablelist])
     charts.register(popularityChart)
-    # Столбчатая диаграмма количества ошибок в зависимости от возраста в диапозоне 10 лет
+    # Столбчатая диаграмма количества ошибок в зависимости от возраста в диапозоне 10 лет.
+    # Данные берутся из сводной таблицы, которая обновляется вместе со счётчиками ошибок
     ageChart = ColumnChart('age', options={'title': 'Mistakes by age',
                                            'height': 400})
-    ages = defaultdict(int)
-    for user in session.query(User).all():
-        for mistake in user.mistakes:
-            ages[user.age // 10] += mistake.count
     ageChart.add_column('string', 'Age range')
     ageChart.add_column('number', 'Count')
-    ageChart.add_rows([[f'{item[0] * 10} - {item[0] * 10 + 9}', item[1]]
-                       for item in sorted(ages.items(), key=lambda x: x[0])])
+    ageChart.add_rows([[f'{stat.bucket * 10} - {stat.bucket * 10 + 9}', stat.count]
+                       for stat in session.query(AgeBucketStat).order_by(AgeBucketStat.bucket)])
     charts.register(ageChart)
     # Круговая диаграмма количества ошибок в зависимости от языка
     languageChart = PieChart('language', options={'title': 'Mistakes by language',
                                                   'height': 400})
-    langs = defaultdict(int)
-    for item in tablelist:
-        langs[item['lang']] += item['count']
     languageChart.add_column('string', 'Language')
     languageChart.add_column('number', 'Count')
-    languageChart.add_rows([[item[0], item[1]] for item in langs.items()])
+    languageChart.add_rows([[acronym, count] for acronym, count in
+                            session.query(Language.acronym, LanguageStat.count)
+                            .join(LanguageStat, LanguageStat.language == Language.id)])
     charts.register(languageChart)
     return render_template('global_stats.html', title='Stats', mistakes=tablelist)
 
@@ -219,7 +314,11 @@ def globalStats():
 @login_required
 def localStats():
     ''' Страница локальной статистики для зарегестрированный пользователей '''
-    session = dbSession.createSession()
+    return responseCache.cachedResponse(renderLocalStats, statistics.userScope(current_user.id))
+
+
+def renderLocalStats():
+    session = dbSession.getSession()
     user = session.query(User).get(current_user.id)
     tablelist = []
     for association in user.mistakes:
@@ -248,12 +347,28 @@ def localStats():
     return render_template('local_stats.html', title='Local stats', mistakes=tablelist)
 
 
+@app.cli.command('rebuild-stats')
+def rebuildStats():
+    ''' Пересчитывает сводные таблицы статистики по счётчикам ошибок '''
+    dbSession.globalInit(app.config['DB_FILE'], **app.config['DB_OPTIONS'])
+    statistics.rebuild()
+
+
+@app.cli.command('export-mistakes')
+@click.option('--format', 'fmt', type=click.Choice(export.FORMATS), default=export.CSV)
+@click.option('--lang', default=None, help='Только ошибки этого языка')
+@click.option('--user', 'userId', type=int, default=None, help='Только ошибки пользователя с этим id')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-')
+def exportMistakes(fmt, lang, userId, output):
+    ''' Выгружает статистику ошибок в CSV или NDJSON '''
+    with redirect_stdout(sys.stderr):  # Сообщение о подключении к БД не должно попасть в выгрузку
+        dbSession.globalInit(app.config['DB_FILE'], **app.config['DB_OPTIONS'])
+    for piece in export.export(fmt, lang, userId):
+        output.write(piece)
+
+
 def main():
-    dbSession.globalInit('db/ortho.db')
-    api.add_resource(mistakesResources.MistakesResouce, '/api/mistakes')
-    api.add_resource(statisticsResources.StatisticsResource, '/api/statistics')
-    api.add_resource(beautifierResources.BeautifierResource, '/api/beautifier')
-    app.run()
+    createApp().run()
 
 
 if __name__ == '__main__':
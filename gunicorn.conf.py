@@ -0,0 +1,19 @@
+''' Настройки gunicorn. Запуск из корня репозитория:
+    gunicorn -c gunicorn.conf.py "flask_app:createApp()"
+    Приложение создаётся в главном процессе до запуска рабочих, поэтому словари pymorphy2
+    загружаются один раз и достаются рабочим процессам при fork копированием при записи '''
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    from data import dbSession
+    dbSession.dispose()  # Соединения с БД, открытые при создании приложения, не должны попасть в рабочие процессы
+    # Объекты, созданные до fork, больше не обходятся сборщиком мусора.
+    # Иначе он меняет их заголовки, и общие страницы памяти копируются в каждый рабочий процесс
+    gc.freeze()
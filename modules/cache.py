@@ -0,0 +1,154 @@
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+
+''' Модуль кэшей с ограниченным размером и временем жизни записей '''
+
+
+class LRUCache:
+    ''' Кэш в памяти процесса. При переполнении вытесняются давно не использованные записи '''
+
+    def __init__(self, maxsize=1000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is not None and (item[1] is None or item[1] > time.time()):
+                self.items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self.items[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self.lock:
+            self.items[key] = (value, expires)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {'size': len(self.items),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / requests if requests else 0.0}
+
+
+class SqliteCache:
+    ''' Кэш в файле SQLite, общий для всех процессов сервера. Значения хранятся в JSON '''
+
+    EVICT_EVERY = 100  # Вытеснение запускается раз в столько записей
+    TOUCH_AFTER = 60  # Время последнего использования обновляется не чаще, чем раз в минуту
+
+    def __init__(self, path, maxsize=100000, ttl=None, table='cache'):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                         '(key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{table}_used ON {table} (used)')
+
+    def _connect(self):
+        ''' Соединение для текущего потока. После fork соединение открывается заново '''
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(f'SELECT value, expires, used FROM {self.table} WHERE key = ?',
+                           (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            self.misses += 1
+            return None
+        if now - row[2] > self.TOUCH_AFTER:
+            with conn:
+                conn.execute(f'UPDATE {self.table} SET used = ? WHERE key = ?', (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        expires = now + self.ttl if self.ttl else None
+        with self._connect() as conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value, ensure_ascii=False), expires, now))
+        self.writes += 1
+        if self.writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        ''' Удаляет устаревшие записи и давно не использованные записи сверх лимита '''
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE expires <= ?', (time.time(),))
+            conn.execute(f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} '
+                         'ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.maxsize,))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def stats(self):
+        size = self._connect().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        requests = self.hits + self.misses
+        return {'size': size,
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / requests if requests else 0.0}
+
+
+class TieredCache:
+    ''' Кэш из двух уровней: быстрый в памяти и общий в SQLite '''
+
+    def __init__(self, memory, shared):
+        self.memory = memory
+        self.shared = shared
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.shared.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.shared.delete(key)
+
+    def stats(self):
+        return {'memory': self.memory.stats(), 'shared': self.shared.stats()}
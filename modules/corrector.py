@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from modules import translator, morphology, statistics, metrics
+
+''' Модуль исправления текста по ошибкам Яндекс.Спеллера '''
+
+WORKERS = 4  # Число слов, язык которых определяется одновременно
+TIMEOUT = 2  # Сколько секунд запрос ждёт определения языков, после этого язык считается неизвестным
+
+__executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='enrich')
+
+
+def _clamp(index, size):
+    ''' Приводит индекс к границам строки так же, как это делает срез '''
+    if index < 0:
+        return max(0, size + index)
+    return min(index, size)
+
+
+def applyCorrections(text, mistakes):
+    ''' Применяет исправления спеллера к тексту за один проход.
+        Результат совпадает с последовательной заменой срезов со сдвигом delta,
+        включая перекрывающиеся и соседние ошибки '''
+    pieces = []  # Уже собранная часть исправленного текста
+    size = 0  # Её длина
+    cursor = 0  # Позиция в исходном тексте, с которой начинается оставшаяся часть
+    delta = 0
+    for m in mistakes:
+        correct = m['s'][0]
+        wrong = text[m['pos']:m['pos'] + m['len']]
+        total = size + len(text) - cursor
+        start = _clamp(m['pos'] + delta, total)
+        end = _clamp(m['pos'] + m['len'] + delta, total)
+        # Если исправление затрагивает уже собранную часть, откатываем её до нужной позиции.
+        # Для упорядоченных неперекрывающихся ошибок ничего не откатывается
+        popped = []
+        while size > min(start, end):
+            piece = pieces.pop()
+            size -= len(piece)
+            popped.append(piece)
+        segment = ''.join(reversed(popped))
+        extra = max(0, max(start, end) - size - len(segment))
+        segment += text[cursor:cursor + extra]
+        cursor += extra
+        head, rest = segment[:start - size], segment[end - size:]
+        for piece in (head, correct, rest):
+            if piece:
+                pieces.append(piece)
+        size += len(head) + len(correct) + len(rest)
+        delta += len(correct) - len(wrong)
+    pieces.append(text[cursor:])
+    return ''.join(pieces)
+
+
+def lookup(words, timeout=None):
+    ''' Начальные формы и языки слов. Каждое слово обрабатывается один раз.
+        Язык определяется локально с кэшем, в пул отправляются только слова с неуверенным ответом,
+        если подключён запасной способ определения языка. Они обрабатываются, пока в текущем
+        потоке строятся начальные формы. Слов, язык которых не определён за timeout секунд,
+        в словаре языков нет. Возвращает словари {слово в нижнем регистре: значение} '''
+    timeout = TIMEOUT if timeout is None else timeout
+    unique = list(dict.fromkeys(word.lower() for word in words))
+    languages = {}
+    futures = {}
+    with metrics.stage('translator'):
+        for word in unique:
+            lang, confident = translator.detectCached(word)
+            if confident or not translator.hasFallback():
+                languages[word] = lang
+            else:
+                futures[word] = __executor.submit(translator.getLanguage, word)
+    with metrics.stage('morphology'):
+        normals = {word: morphology.normalForm(word) for word in unique}
+    with metrics.stage('translator'):
+        done, pending = wait(futures.values(), timeout)
+    # Задачи, которые ещё ждут в очереди, отменяются, чтобы очередь не росла при медленном сервисе.
+    # Уже запущенные завершатся и заполнят кэш языков для следующих запросов
+    for future in pending:
+        future.cancel()
+    languages.update((word, future.result()) for word, future in futures.items()
+                     if future in done and future.exception() is None)
+    metrics.inc('ortho_translator_timeouts_total', len(pending))
+    return normals, languages
+
+
+def enrich(text, mistakes):
+    ''' Исправляет текст и определяет начальные формы и языки исправленных слов.
+        Возвращает исправленный текст, таблицу ошибок и пары (начальная форма, язык) для статистики.
+        Слова, язык которых не определён вовремя, в таблице получают язык UNKNOWN, а в статистику
+        не попадают: язык ошибки записывается в БД один раз и потом не меняется '''
+    tablelist = []
+    normals = []
+    forms, languages = lookup([m['s'][0] for m in mistakes])
+    for m in mistakes:
+        correct = m['s'][0]  # Исправленное слово
+        wrong = text[m['pos']:m['pos'] + m['len']]  # Ошибочное слово
+        normal = forms[correct.lower()]  # Исправленное слово в начальной форме
+        langAcronym = languages.get(correct.lower())
+        if langAcronym is None:
+            langAcronym = translator.UNKNOWN
+        else:
+            normals.append((normal, langAcronym))
+        tablelist.append({'wrong': wrong.lower(),
+                          'correct': correct.lower(),
+                          'pos': m['pos'],
+                          'lang': langAcronym})
+    return applyCorrections(text, mistakes), tablelist, normals
+
+
+def correct(text, mistakes, userId=None):
+    ''' Исправляет текст и записывает ошибки в статистику.
+        Возвращает исправленный текст и таблицу ошибок '''
+    corrected, tablelist, normals = enrich(text, mistakes)
+    # Все ошибки текста записываются в БД одной транзакцией
+    statistics.record(normals, userId)
+    return corrected, tablelist
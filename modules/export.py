@@ -0,0 +1,88 @@
+from sqlalchemy import and_, null
+from data import dbSession
+from data.mistakes import Mistake
+from data.languages import Language
+from data.association import Association
+from data.users import User
+import csv
+import io
+import json
+
+''' Модуль выгрузки статистики ошибок в CSV и NDJSON.
+    Строки читаются одним запросом с JOIN порциями по BATCH_SIZE и сразу отдаются,
+    поэтому память не зависит от числа строк '''
+
+BATCH_SIZE = 1000  # Сколько строк читается из БД за раз
+COLUMNS = ('mistake', 'lang', 'total', 'user', 'age', 'count')
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+
+def rowsQuery(session, lang=None, userId=None, perUser=True):
+    ''' Запрос строк выгрузки. Без perUser - только общие счётчики ошибок без пользователей '''
+    if not perUser:
+        query = session.query(Mistake.name, Language.acronym, Mistake.count,
+                              null(), null(), null()) \
+            .outerjoin(Language, Language.id == Mistake.language)
+        if lang:
+            query = query.filter(Language.acronym == lang)
+        return query.order_by(Mistake.id)
+    userJoin = Association.mistake == Mistake.id
+    if userId is not None:
+        userJoin = and_(userJoin, Association.user == userId)
+    query = session.query(Mistake.name, Language.acronym, Mistake.count,
+                          Association.user, User.age, Association.count) \
+        .outerjoin(Language, Language.id == Mistake.language) \
+        .outerjoin(Association, userJoin) \
+        .outerjoin(User, User.id == Association.user)
+    if lang:
+        query = query.filter(Language.acronym == lang)
+    if userId is not None:
+        query = query.filter(Association.user.isnot(None))
+    # Порядок совпадает с индексами ix_association_mistake и ix_mistakes_language,
+    # поэтому SQLite отдаёт строки по мере чтения без сортировки всей выгрузки
+    return query.order_by(Mistake.id, Association.user)
+
+
+def iterRows(lang=None, userId=None, perUser=True):
+    ''' Строки (ошибка, язык, всего, id пользователя, возраст, число у пользователя).
+        Ошибка без пользователей даёт одну строку с пустыми полями пользователя.
+        lang и userId оставляют только ошибки этого языка или этого пользователя.
+        Без perUser поля пользователя пустые у всех строк, по строке на ошибку '''
+    session = dbSession.createSession()
+    try:
+        yield from rowsQuery(session, lang, userId, perUser).yield_per(BATCH_SIZE)
+    finally:
+        session.close()
+
+
+def toCsv(rows):
+    ''' Строки CSV с заголовком. Текст отдаётся порциями по BATCH_SIZE строк '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for number, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if number % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def toNdjson(rows):
+    ''' Строки NDJSON, по объекту на строку. Текст отдаётся порциями по BATCH_SIZE строк '''
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + '\n')
+        if len(lines) == BATCH_SIZE:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+def export(fmt=NDJSON, lang=None, userId=None, perUser=True):
+    ''' Выгрузка в формате fmt в виде потока кусков текста '''
+    rows = iterRows(lang, userId, perUser)
+    return toCsv(rows) if fmt == CSV else toNdjson(rows)
@@ -0,0 +1,49 @@
+from secrets import token_hex
+import fcntl
+import os
+
+''' Файлы процессов в общем каталоге. Процесс держит блокировку своего файла, пока жив,
+    поэтому другие процессы отличают файлы работающих процессов от файлов завершившихся
+    и могут забрать или удалить последние '''
+
+
+def create(directory, prefix, suffix, mode='w'):
+    ''' Создаёт и блокирует файл текущего процесса <prefix>-<pid>-<случайная часть><suffix>.
+        Имя уникально даже при повторе pid '''
+    path = os.path.join(directory, f'{prefix}-{os.getpid()}-{token_hex(4)}{suffix}')
+    file = open(path, mode)
+    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return file
+
+
+def alive(path):
+    ''' Работает ли процесс, которому принадлежит файл '''
+    try:
+        file = open(path)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        return False
+    except OSError:
+        return True
+    finally:
+        file.close()
+
+
+def claim(path):
+    ''' Открывает и блокирует для чтения файл завершившегося процесса.
+        Возвращает None, если процесс работает или файл уже забрал другой процесс '''
+    try:
+        file = open(path)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        return None
+    if not os.path.exists(path):
+        file.close()  # Файл удалён процессом, который забрал его раньше
+        return None
+    return file
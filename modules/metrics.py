@@ -0,0 +1,316 @@
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from modules import lockfile
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+''' Модуль метрик: гистограммы времени этапов, счётчики и текущие значения.
+    Метрики отдаются в текстовом формате Prometheus и заголовком Server-Timing.
+    Пока сбор не включён через enable, все функции модуля сразу возвращаются.
+    Значения хранятся в памяти процесса. Если задан общий каталог через setDirectory,
+    каждый процесс раз в FLUSH_INTERVAL секунд сохраняет туда свои значения, и render
+    складывает значения всех процессов, как multiprocess-режим prometheus_client.
+    Счётчики и гистограммы завершившихся процессов остаются в сумме, текущие значения - нет '''
+
+# Границы корзин гистограмм в секундах
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FLUSH_INTERVAL = 1  # Как часто процесс сохраняет свои значения в общий каталог, в секундах
+
+__enabled = False
+__lock = threading.Lock()
+__histograms = {}  # {(имя, метки): [счётчики корзин, сумма, количество]}
+__counters = {}  # {(имя, метки): значение}
+__gauges = {}  # {(имя, метки): значение}
+__collectors = []
+__timings = ContextVar('timings', default=None)  # Время этапов текущего запроса
+__null = nullcontext()
+__directory = None
+__writer = None  # (pid, путь к файлам процесса без расширения, заблокированный файл .lock)
+__writerLock = threading.Lock()
+
+
+def enable(enabled=True):
+    ''' Включает или выключает сбор метрик '''
+    global __enabled
+    __enabled = enabled
+
+
+def enabled():
+    return __enabled
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    ''' Добавляет значение в гистограмму '''
+    if not __enabled:
+        return
+    key = _key(name, labels)
+    with __lock:
+        histogram = __histograms.get(key)
+        if histogram is None:
+            histogram = __histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        index = bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+def inc(name, n=1, **labels):
+    ''' Увеличивает счётчик '''
+    if not __enabled or not n:
+        return
+    key = _key(name, labels)
+    with __lock:
+        __counters[key] = __counters.get(key, 0) + n
+
+
+def add(name, delta, **labels):
+    ''' Изменяет текущее значение, например число обрабатываемых запросов '''
+    if not __enabled:
+        return
+    key = _key(name, labels)
+    with __lock:
+        __gauges[key] = __gauges.get(key, 0) + delta
+
+
+def addCollector(collector):
+    ''' Подключает функцию, которая при выгрузке метрик возвращает текущие значения
+        в виде троек (имя, метки, значение), например размер кэша '''
+    __collectors.append(collector)
+
+
+def record(name, seconds):
+    ''' Учитывает время этапа, измеренное вызывающим кодом '''
+    if not __enabled:
+        return
+    observe('ortho_stage_seconds', seconds, stage=name)
+    timings = __timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def _stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def stage(name):
+    ''' Контекстный менеджер, который измеряет время этапа. Время попадает в гистограмму
+        ortho_stage_seconds и, если этап выполняется в потоке запроса, в Server-Timing '''
+    if not __enabled:
+        return __null
+    return _stage(name)
+
+
+def timed(name):
+    ''' Декоратор, который измеряет время вызова функции как этап name '''
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not __enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def begin():
+    ''' Начинает учёт этапов запроса. Возвращает метку для end '''
+    if __directory is not None:
+        _startWriter()
+    return __timings.set({})
+
+
+def end(token):
+    ''' Заканчивает учёт этапов запроса и возвращает их время '''
+    timings = __timings.get()
+    try:
+        __timings.reset(token)
+    except ValueError:
+        __timings.set(None)  # Запрос закончился в другом контексте, например после потоковой выдачи
+    return timings or {}
+
+
+def serverTiming():
+    ''' Значение заголовка Server-Timing с временем этапов текущего запроса в миллисекундах '''
+    timings = __timings.get() or {}
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _byName(items):
+    grouped = {}
+    for (name, labels), value in sorted(items.items()):
+        grouped.setdefault(name, []).append((labels, value))
+    return grouped
+
+
+def _snapshot():
+    ''' Копия значений процесса вместе со значениями функций addCollector '''
+    with __lock:
+        histograms = {key: (list(buckets), total, count)
+                      for key, (buckets, total, count) in __histograms.items()}
+        counters = dict(__counters)
+        gauges = dict(__gauges)
+    for collector in __collectors:
+        for name, labels, value in collector():
+            gauges[_key(name, labels)] = value
+    return histograms, counters, gauges
+
+
+def setDirectory(path):
+    ''' Задаёт общий каталог для процессов сервера, None - отдавать значения своего процесса.
+        Файлы процессов, которые уже завершились, удаляются '''
+    global __directory, __writer
+    with __writerLock:
+        if __writer is not None:
+            __writer[2].close()
+        __writer = None
+        __directory = path
+    if path is None:
+        return
+    os.makedirs(path, exist_ok=True)
+    for lockPath in glob.glob(os.path.join(path, 'metrics-*.lock')):
+        lock = lockfile.claim(lockPath)
+        if lock is None:
+            continue
+        for extension in ('.json', '.lock'):
+            try:
+                os.remove(lockPath[:-len('.lock')] + extension)
+            except FileNotFoundError:
+                pass
+        lock.close()
+
+
+def _startWriter():
+    ''' Создаёт файлы текущего процесса и поток, который их обновляет. После fork создаются новые '''
+    global __writer
+    if __writer is not None and __writer[0] == os.getpid():
+        return
+    with __writerLock:
+        if __directory is None or __writer is not None and __writer[0] == os.getpid():
+            return
+        lock = lockfile.create(__directory, 'metrics', '.lock')
+        __writer = writer = (os.getpid(), lock.name[:-len('.lock')], lock)
+    threading.Thread(target=_run, args=(writer,), name='metrics-writer', daemon=True).start()
+    atexit.register(_save, writer)
+
+
+def _save(writer):
+    ''' Записывает значения процесса в его файл. Файл заменяется целиком, поэтому
+        другие процессы не видят его недописанным '''
+    if writer is not __writer or writer[0] != os.getpid():
+        return  # Обработчик atexit главного процесса, унаследованный при fork
+    histograms, counters, gauges = _snapshot()
+    data = {'histograms': [[name, labels, *value] for (name, labels), value in histograms.items()],
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'gauges': [[name, labels, value] for (name, labels), value in gauges.items()]}
+    with open(writer[1] + '.tmp', 'w') as file:
+        json.dump(data, file)
+    os.replace(writer[1] + '.tmp', writer[1] + '.json')
+
+
+def _run(writer):
+    while __writer is writer:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            _save(writer)
+        except OSError:
+            pass  # Каталог недоступен, значения запишутся при следующей попытке
+
+
+def _merged():
+    ''' Сумма значений всех процессов из общего каталога '''
+    _startWriter()
+    _save(__writer)  # Свои значения записываются перед чтением, чтобы ответ был свежим
+    histograms, counters, gauges = {}, {}, {}
+    for path in glob.glob(os.path.join(__directory, 'metrics-*.json')):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue  # Файл удалён при очистке каталога
+        alive = lockfile.alive(path[:-len('.json')] + '.lock')
+        for name, labels, buckets, total, count in data['histograms']:
+            key = name, tuple(map(tuple, labels))
+            merged = histograms.setdefault(key, ([0] * len(BUCKETS), 0.0, 0))
+            histograms[key] = ([a + b for a, b in zip(merged[0], buckets)], merged[1] + total, merged[2] + count)
+        for name, labels, value in data['counters']:
+            key = name, tuple(map(tuple, labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in data['gauges'] if alive else ():
+            key = name, tuple(map(tuple, labels))
+            gauges[key] = gauges.get(key, 0) + value
+    return histograms, counters, gauges
+
+
+def render():
+    ''' Все метрики в текстовом формате Prometheus '''
+    histograms, counters, gauges = _merged() if __directory is not None else _snapshot()
+    lines = []
+    for name, series in _byName(histograms).items():
+        lines.append(f'# TYPE {name} histogram')
+        for labels, (buckets, total, count) in series:
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+    for kind, items in (('counter', counters), ('gauge', gauges)):
+        for name, series in _byName(items).items():
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in series:
+                lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    ''' Очищает накопленные значения '''
+    with __lock:
+        __histograms.clear()
+        __counters.clear()
+        __gauges.clear()
+
+
+def _forked():
+    ''' Рабочий процесс не должен отдавать значения, накопленные главным процессом до fork '''
+    global __lock, __writerLock, __writer
+    __lock = threading.Lock()
+    __writerLock = threading.Lock()
+    if __writer is not None:
+        __writer[2].close()  # Блокировка остаётся у главного процесса
+    __writer = None
+    reset()
+
+
+os.register_at_fork(after_in_child=_forked)
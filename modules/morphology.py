@@ -0,0 +1,52 @@
+from functools import lru_cache
+import threading
+import pymorphy2
+
+''' Модуль морфологии. Один анализатор pymorphy2 на процесс '''
+
+CACHE_SIZE = 10000  # Максимальное число начальных форм в кэше
+
+__morph = None
+__lock = threading.Lock()
+
+
+def getMorph():
+    ''' Возвращает общий анализатор, загружая словари при первом обращении '''
+    global __morph
+    if __morph is None:
+        with __lock:
+            if __morph is None:
+                __morph = pymorphy2.MorphAnalyzer()
+    return __morph
+
+
+def normalForm(word):
+    ''' Начальная форма слова. Повторные слова берутся из кэша '''
+    # pymorphy2 всё равно разбирает слово в нижнем регистре
+    return _normalForm(word.lower())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalForm(word):
+    return getMorph().parse(word)[0].normal_form
+
+
+def isKnown(word):
+    ''' Есть ли слово в словаре pymorphy2 '''
+    return _isKnown(word.lower())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _isKnown(word):
+    return getMorph().word_is_known(word)
+
+
+def cacheInfo():
+    ''' Размер кэша начальных форм и доля попаданий '''
+    info = _normalForm.cache_info()
+    requests = info.hits + info.misses
+    return {'size': info.currsize,
+            'maxsize': info.maxsize,
+            'hits': info.hits,
+            'misses': info.misses,
+            'hitRate': info.hits / requests if requests else 0.0}
@@ -0,0 +1,69 @@
+from bisect import bisect_right
+from modules import morphology
+import re
+
+''' Модуль предварительной проверки текста по локальному словарю.
+    Слова, которые знает pymorphy2, и слова из списка разрешённых не отправляются в спеллер.
+    Спеллеру передаются только фрагменты с незнакомыми словами и их соседями '''
+
+CONTEXT = 1  # Сколько соседних слов с каждой стороны отправляется вместе с незнакомым словом
+
+WORD = re.compile(r"[^\W\d_]+(?:[-'’][^\W\d_]+)*")
+
+__allowlist = frozenset()
+
+
+def setAllowlist(words):
+    ''' Задаёт слова, которые считаются верными, даже если их нет в словаре '''
+    global __allowlist
+    __allowlist = frozenset(word.lower() for word in words)
+
+
+def isSuspicious(word):
+    ''' Нужно ли проверять слово в спеллере '''
+    return word.lower() not in __allowlist and not morphology.isKnown(word)
+
+
+def fragments(text, context=None):
+    ''' Участки текста, которые нужно проверить: незнакомые слова вместе с context соседями.
+        Возвращает пары (начало, конец), пересекающиеся участки объединяются '''
+    context = CONTEXT if context is None else context
+    words = [(match.start(), match.end(), match.group()) for match in WORD.finditer(text)]
+    spans = []
+    for i, (_, _, word) in enumerate(words):
+        if not isSuspicious(word):
+            continue
+        start = words[max(i - context, 0)][0]
+        end = words[min(i + context, len(words) - 1)][1]
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def reduce(text):
+    ''' Сокращённый текст для спеллера и таблица смещений для restore.
+        Фрагменты разделяются переводом строки, чтобы спеллер не связывал их между собой '''
+    spans = fragments(text)
+    starts = []
+    offset = 0
+    for start, end in spans:
+        starts.append(offset)
+        offset += end - start + 1
+    reduced = '\n'.join(text[start:end] for start, end in spans)
+    return reduced, (starts, [start for start, _ in spans])
+
+
+def restore(mistakes, text, offsets):
+    ''' Переводит позиции ошибок сокращённого текста в координаты исходного '''
+    starts, origins = offsets
+    lines = None
+    for m in mistakes:
+        index = bisect_right(starts, m['pos']) - 1
+        m['pos'] = origins[index] + m['pos'] - starts[index]
+        if lines is None:
+            lines = [0] + [match.end() for match in re.finditer('\n', text)]
+        row = bisect_right(lines, m['pos']) - 1
+        m['row'], m['col'] = row, m['pos'] - lines[row]
+    return mistakes
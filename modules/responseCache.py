@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+from flask import make_response, request, Response
+from werkzeug.http import is_resource_modified
+from modules import cache, statistics
+import hashlib
+
+''' Кэш ответов со статистикой. Ответ зависит только от версии статистики,
+    поэтому он строится один раз на версию и отдаётся с ETag и Last-Modified.
+    Клиент, у которого уже есть актуальный ответ, получает 304 без тела '''
+
+CACHE_SIZE = 200  # Число ответов, которые хранятся в памяти процесса
+
+__cache = cache.LRUCache(CACHE_SIZE)
+
+
+def cachedResponse(build, scope=statistics.GLOBAL, key=''):
+    ''' Ответ build() для версии статистики scope. key различает ответы одной версии,
+        например параметры запроса или пользователя, для которого отрисована страница '''
+    value, changed = statistics.generation(scope)
+    etag = hashlib.sha1(repr((scope, value, key)).encode()).hexdigest()
+    lastModified = datetime.fromtimestamp(int(changed), timezone.utc) if changed else None
+    if not is_resource_modified(request.environ, etag, last_modified=lastModified):
+        response = Response(status=304)
+    else:
+        cached = __cache.get(etag)
+        if cached is None:
+            built = make_response(build())
+            cached = (built.get_data(), built.status_code, built.mimetype)
+            if built.status_code == 200:
+                __cache.set(etag, cached)
+        data, status, mimetype = cached
+        response = Response(data, status, mimetype=mimetype)
+    response.set_etag(etag)
+    if lastModified:
+        response.last_modified = lastModified
+    response.cache_control.no_cache = True  # Клиент проверяет актуальность при каждом запросе
+    return response
+
+
+def clear():
+    ''' Очищает кэш ответов '''
+    global __cache
+    __cache = cache.LRUCache(CACHE_SIZE)
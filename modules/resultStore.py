@@ -0,0 +1,29 @@
+from secrets import token_urlsafe
+from modules import cache, metrics
+
+''' Хранилище результатов проверки для страницы /result/<id> '''
+
+STORE_SIZE = 1000  # Максимальное число хранимых результатов
+STORE_TTL = 60 * 60  # Время хранения результата в секундах
+
+__store = cache.LRUCache(STORE_SIZE, STORE_TTL)
+
+
+def setStore(store):
+    ''' Подключает другое хранилище, например cache.SqliteCache, общее для всех процессов '''
+    global __store
+    __store = store
+
+
+@metrics.timed('result_store')
+def save(text, tablelist):
+    ''' Сохраняет исправленный текст и таблицу ошибок. Возвращает короткий идентификатор '''
+    resultId = token_urlsafe(8)
+    __store.set(resultId, {'text': text, 'tablelist': tablelist})
+    return resultId
+
+
+@metrics.timed('result_store')
+def load(resultId):
+    ''' Результат по идентификатору или None, если он устарел или вытеснен '''
+    return __store.get(resultId)
@@ -1,12 +1,301 @@
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from modules import cache, metrics, prefilter
+import hashlib
+import re
+import threading
+import time
 import requests
 
 ''' Модуль Яндекс.Спеллера '''
 
+URL = 'https://speller.yandex.net/services/spellservice.json/checkText'
+CHUNK_SIZE = 10000  # Максимальная длина текста в одном запросе к сервису
+WORKERS = 4  # Число одновременных запросов к сервису
+TIMEOUT = 5  # Таймаут одного запроса в секундах
+RETRIES = 3  # Число попыток для одного фрагмента
+BACKOFF = 0.5  # Начальная пауза между попытками в секундах, удваивается с каждой попыткой
+BREAKER_THRESHOLD = 5  # Число неудачных проверок подряд, после которого сервис считается недоступным
+BREAKER_TIMEOUT = 30  # Время в секундах, на которое запросы к недоступному сервису прекращаются
+BATCH_WINDOW = 16  # Сколько текстов пакета проверяется одновременно
+CACHE_SIZE = 10000  # Число абзацев, ответы для которых хранятся в кэше
+CACHE_TTL = 24 * 60 * 60  # Время жизни ответа в кэше в секундах
 
+SENTENCE_END = re.compile(r'[.!?…]+["»)\]]*\s+|\n+')
+
+
+class SpellerError(Exception):
+    ''' Спеллер недоступен '''
+
+
+class HttpBackend:
+    ''' Проверка текста через HTTP API спеллера. Соединения переиспользуются '''
+
+    def __init__(self, url=URL, timeout=TIMEOUT, poolSize=WORKERS):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def check(self, text):
+        response = self.session.post(self.url, data={'text': text, 'format': 'plain'},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+class CircuitBreaker:
+    ''' Прекращает обращения к сервису после серии неудач и пробует снова через timeout секунд '''
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, timeout=BREAKER_TIMEOUT):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.failures = 0
+        self.openedAt = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.openedAt is None:
+                return True
+            if time.monotonic() - self.openedAt >= self.timeout:
+                # Пропускаем пробный запрос, до его результата остальные отклоняются
+                self.openedAt = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.openedAt = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.openedAt = time.monotonic()
+
+
+__backend = HttpBackend()
+__breaker = CircuitBreaker()
+__executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='speller')
+# Тексты пакета проверяются в отдельном пуле, чтобы не ждать фрагменты в том же пуле
+__batchExecutor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='speller-batch')
+__cache = cache.LRUCache(CACHE_SIZE, CACHE_TTL)
+__prefilter = False
+
+
+def setBackend(backend):
+    ''' Подключает другой способ проверки, например HttpBackend с адресом локальной заглушки.
+        Объект должен иметь метод check(text), возвращающий ответ спеллера '''
+    global __backend, __breaker
+    __backend = backend
+    __breaker = CircuitBreaker()
+
+
+def setCache(newCache):
+    ''' Подключает другой кэш ответов, например cache.TieredCache с общим SQLite.
+        None отключает кэширование '''
+    global __cache
+    __cache = newCache
+
+
+def setPrefilter(enabled):
+    ''' Включает предварительную проверку по локальному словарю, см. модуль prefilter.
+        Тогда в сервис отправляются только фрагменты с незнакомыми словами '''
+    global __prefilter
+    __prefilter = enabled
+
+
+def cacheInfo():
+    ''' Размер кэша ответов и доля попаданий '''
+    return __cache.stats() if __cache is not None else {}
+
+
+def splitText(text, size=None):
+    ''' Делит текст на фрагменты не длиннее size по границам предложений.
+        Возвращает пары (смещение фрагмента, фрагмент) '''
+    size = size or CHUNK_SIZE
+    chunks = []
+    start = 0
+    while len(text) - start > size:
+        limit = start + size
+        end = None
+        for match in SENTENCE_END.finditer(text, start + 1, limit):
+            end = match.end()
+        if end is None:
+            # Предложение длиннее фрагмента, режем по последнему пробелу
+            space = text.rfind(' ', start + 1, limit)
+            end = space + 1 if space > start else limit
+        chunks.append((start, text[start:end]))
+        start = end
+    if start < len(text) or not chunks:
+        chunks.append((start, text[start:]))
+    return chunks
+
+
+def iterWindows(pieces, size=None):
+    ''' Собирает поток кусков текста в окна не длиннее size по границам предложений.
+        Выдаёт пары (смещение окна в документе, окно). В памяти держится не больше одного окна '''
+    size = size or CHUNK_SIZE
+    buffer = ''
+    offset = 0
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) > size:
+            _, window = splitText(buffer, size)[0]
+            yield offset, window
+            offset += len(window)
+            buffer = buffer[len(window):]
+    if buffer:
+        yield offset, buffer
+
+
+def _check(chunk):
+    ''' Проверяет один фрагмент с повторами при сбоях '''
+    breaker = __breaker
+    for attempt in range(RETRIES):
+        if not breaker.allow():
+            raise SpellerError('Спеллер временно недоступен')
+        try:
+            with metrics.stage('speller_request'):
+                mistakes = __backend.check(chunk)
+        except requests.HTTPError as error:
+            metrics.inc('ortho_upstream_errors_total', service='speller')
+            if error.response is not None and error.response.status_code < 500:
+                # Ошибка в самом запросе, повтор не поможет
+                raise SpellerError(str(error)) from error
+            breaker.failure()
+        except (requests.ConnectionError, requests.Timeout, ValueError):
+            metrics.inc('ortho_upstream_errors_total', service='speller')
+            breaker.failure()
+        else:
+            breaker.success()
+            return mistakes
+        if attempt + 1 < RETRIES:
+            time.sleep(BACKOFF * 2 ** attempt)
+    raise SpellerError('Спеллер не ответил')
+
+
+def _shift(mistakes, text, offset):
+    ''' Переводит позиции ошибок фрагмента в координаты всего текста '''
+    if not offset:
+        return mistakes
+    rows = text.count('\n', 0, offset)
+    col = offset - text.rfind('\n', 0, offset) - 1  # Позиция начала фрагмента в своей строке
+    for m in mistakes:
+        if m.get('row', 0) == 0 and 'col' in m:
+            m['col'] += col
+        if 'row' in m:
+            m['row'] += rows
+        m['pos'] += offset
+    return mistakes
+
+
+def _checkText(text):
+    ''' Проверяет текст, при включённом фильтре - только его подозрительные фрагменты '''
+    if not __prefilter:
+        return _checkChunks(text)
+    reduced, offsets = prefilter.reduce(text)
+    if not reduced:
+        return []
+    return prefilter.restore(_checkChunks(reduced), text, offsets)
+
+
+def _checkChunks(text):
+    ''' Проверяет текст. Длинный текст проверяется по частям параллельно '''
+    chunks = splitText(text)
+    if len(chunks) == 1:
+        return _check(text)
+    results = __executor.map(_check, [chunk for _, chunk in chunks])
+    mistakes = []
+    for (offset, _), result in zip(chunks, results):
+        mistakes.extend(_shift(result, text, offset))
+    return mistakes
+
+
+def _paragraphs(text):
+    ''' Непустые строки текста без окружающих пробелов.
+        Возвращает четвёрки (начало строки, число пробелов в начале, номер строки, абзац) '''
+    start = 0
+    for row, line in enumerate(text.split('\n')):
+        paragraph = line.strip()
+        if paragraph:
+            yield start, len(line) - len(line.lstrip()), row, paragraph
+        start += len(line) + 1
+
+
+def _key(paragraph):
+    ''' Ключ кэша - хеш содержимого абзаца '''
+    return hashlib.sha256(paragraph.encode()).hexdigest()
+
+
+@metrics.timed('speller')
 def getMistakes(text):
-    url = 'https://speller.yandex.net/services/spellservice.json/checkText'
-    params = {
-        'text': text,
-        'format': 'plain'
-    }
-    return requests.get(url, params).json()
+    ''' Ошибки текста в формате Яндекс.Спеллера.
+        Ответы кэшируются по абзацам, в сервис отправляются только новые абзацы '''
+    if __cache is None:
+        return _checkText(text)
+    paragraphs = [(start, indent, row, _key(paragraph), paragraph)
+                  for start, indent, row, paragraph in _paragraphs(text)]
+    found = {}
+    missing = {}
+    for *_, key, paragraph in paragraphs:
+        if key in found or key in missing:
+            continue
+        cached = __cache.get(key)
+        if cached is None:
+            missing[key] = paragraph
+        else:
+            found[key] = cached
+    metrics.inc('ortho_cache_total', len(found), cache='speller', result='hit')
+    metrics.inc('ortho_cache_total', len(missing), cache='speller', result='miss')
+    if missing:
+        # Новые абзацы проверяются одним текстом, затем ответ делится между ними
+        keys = list(missing)
+        starts = []
+        offset = 0
+        for key in keys:
+            starts.append(offset)
+            offset += len(missing[key]) + 1
+        checked = {key: [] for key in keys}
+        for m in _checkText('\n'.join(missing.values())):
+            index = bisect_right(starts, m['pos']) - 1
+            m['pos'] -= starts[index]
+            m['row'], m['col'] = 0, m['pos']
+            checked[keys[index]].append(m)
+        for key, result in checked.items():
+            __cache.set(key, result)
+        found.update(checked)
+    mistakes = []
+    for start, indent, row, key, _ in paragraphs:
+        for m in found[key]:
+            m = dict(m)
+            m['pos'] += start + indent
+            m['row'], m['col'] = row, m['col'] + indent
+            mistakes.append(m)
+    return mistakes
+
+
+def _result(future):
+    try:
+        return future.result(), None
+    except SpellerError as error:
+        return None, error
+
+
+def iterMistakes(texts, ahead=None):
+    ''' Проверяет несколько текстов параллельно. Выдаёт пары (ошибки, SpellerError или None)
+        в порядке texts по мере готовности, одновременно проверяется не больше ahead текстов '''
+    ahead = ahead or BATCH_WINDOW
+    pending = deque()
+    for text in texts:
+        pending.append(__batchExecutor.submit(getMistakes, text))
+        if len(pending) >= ahead:
+            yield _result(pending.popleft())
+    while pending:
+        yield _result(pending.popleft())
@@ -0,0 +1,418 @@
+from collections import Counter
+from sqlalchemy import bindparam, func
+from data import dbSession
+from data.mistakes import Mistake
+from data.languages import Language
+from data.association import Association
+from data.users import User
+from data.languageStats import LanguageStat
+from data.ageStats import AgeStat, AgeBucketStat
+from data.generations import Generation
+from data.mistakeEvents import MistakeEvent, HourlyStat, DailyStat, NO_AGE
+from modules import lockfile, metrics
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+''' Модуль записи статистики ошибок.
+    В режиме sync счётчики обновляются в БД во время запроса,
+    в режиме buffered накапливаются в памяти и записываются пачками в фоновом потоке '''
+
+CHUNK_SIZE = 500  # Число параметров в одном запросе с IN, SQLite ограничивает их количество
+HOUR = 60 * 60
+DAY = 24 * HOUR
+EVENT_RETENTION = 7 * DAY  # Сколько секунд хранится журнал ошибок, сводки по нему уже посчитаны
+HOURLY_RETENTION = 90 * DAY  # Сколько секунд хранятся почасовые сводки, суточные хранятся всегда
+PRUNE_INTERVAL = HOUR  # Как часто процесс удаляет устаревшие записи после записи статистики
+GLOBAL = 'global'  # Версия общей статистики, версии статистики пользователей - user:<id>
+SYNC = 'sync'
+BUFFERED = 'buffered'
+RETRY_LIMIT = 300  # Наибольшая пауза между попытками сброса буфера, пока БД недоступна, в секундах
+
+logger = logging.getLogger(__name__)
+
+__settings = {'mode': SYNC, 'spool': None, 'interval': 5, 'size': 1000}
+__buffer = None
+__bufferLock = threading.Lock()
+__pruned = 0  # Время последней очистки в этом процессе
+
+
+def _chunks(items):
+    items = list(items)
+    for i in range(0, len(items), CHUNK_SIZE):
+        yield items[i:i + CHUNK_SIZE]
+
+
+def configure(mode=SYNC, spool=None, interval=5, size=1000):
+    ''' Выбирает режим записи. В режиме buffered счётчики сбрасываются в БД раз в interval
+        секунд или после size разных записей. spool - каталог, в котором накопленные
+        счётчики дублируются на диск, чтобы пережить падение процесса '''
+    if mode not in (SYNC, BUFFERED):
+        raise ValueError(f'Неизвестный режим записи статистики: {mode}')
+    __settings.update(mode=mode, spool=spool, interval=interval, size=size)
+
+
+def record(mistakes, userId=None):
+    ''' Записывает ошибки в статистику.
+        mistakes - пары (начальная форма слова, язык), по одной на каждую ошибку '''
+    recordCounts(Counter((normal, langAcronym, userId) for normal, langAcronym in mistakes))
+
+
+def recordCounts(counts):
+    ''' Записывает уже сложенные счётчики, например накопленные по пакету текстов.
+        counts - Counter с ключами (начальная форма, язык, id пользователя или None) '''
+    if not counts:
+        return
+    if __settings['mode'] == BUFFERED:
+        getBuffer().add(counts)
+    else:
+        write(counts)
+
+
+@metrics.timed('db_write')
+def write(counts):
+    ''' Записывает счётчики в БД одной транзакцией.
+        counts - Counter с ключами (начальная форма, язык, id пользователя или None) '''
+    global __pruned
+    now = int(time.time())
+    totals = Counter()
+    userTotals = Counter()
+    languageOf = {}  # Язык слова берётся из его первого вхождения
+    for (normal, langAcronym, userId), n in counts.items():
+        totals[normal] += n
+        languageOf.setdefault(normal, langAcronym)
+        if userId is not None:
+            userTotals[userId, normal] += n
+    languages = Language.__table__
+    mistakesTable = Mistake.__table__
+    associations = Association.__table__
+    session = dbSession.createSession()
+    try:
+        # Вставка идёт первой, поэтому блокировка на запись берётся в начале транзакции
+        # и дальнейшие чтения не устаревают до коммита
+        session.execute(languages.insert().prefix_with('OR IGNORE'),
+                        [{'acronym': acronym} for acronym in set(languageOf.values())])
+        languageIds = {}
+        for chunk in _chunks(set(languageOf.values())):
+            languageIds.update(session.query(Language.acronym, Language.id)
+                               .filter(Language.acronym.in_(chunk)))
+        found = _findMistakes(session, totals)
+        missing = [normal for normal in totals if normal not in found]
+        if missing:
+            # Если ошибки незнакомые, добавим их в БД
+            session.execute(mistakesTable.insert(),
+                            [{'name': normal, 'count': 0, 'language': languageIds[languageOf[normal]]}
+                             for normal in missing])
+            found.update(_findMistakes(session, missing))
+        mistakeIds = {normal: mistakeId for normal, (mistakeId, _) in found.items()}
+        session.execute(mistakesTable.update()
+                        .where(mistakesTable.c.id == bindparam('mistakeId'))
+                        .values(count=func.coalesce(mistakesTable.c.count, 0) + bindparam('n')),
+                        [{'mistakeId': mistakeIds[normal], 'n': n} for normal, n in totals.items()])
+        # Статистика по языкам считается по языку, записанному у ошибки
+        languageTotals = Counter()
+        for normal, n in totals.items():
+            if found[normal][1] is not None:
+                languageTotals[found[normal][1]] += n
+        _increment(session, LanguageStat.__table__, 'language', languageTotals)
+        ages = {}
+        if userTotals:
+            # Ошибки известных пользователей записываются в ассоциативную БД
+            session.execute(associations.insert().prefix_with('OR IGNORE'),
+                            [{'user': userId, 'mistake': mistakeIds[normal], 'count': 0}
+                             for userId, normal in userTotals])
+            session.execute(associations.update()
+                            .where(associations.c.user == bindparam('userId'))
+                            .where(associations.c.mistake == bindparam('mistakeId'))
+                            .values(count=func.coalesce(associations.c.count, 0) + bindparam('n')),
+                            [{'userId': userId, 'mistakeId': mistakeIds[normal], 'n': n}
+                             for (userId, normal), n in userTotals.items()])
+            for chunk in _chunks({userId for userId, _ in userTotals}):
+                ages.update(session.query(User.id, User.age).filter(User.id.in_(chunk)))
+            ageTotals = Counter()
+            for (userId, _), n in userTotals.items():
+                if ages.get(userId) is not None:
+                    ageTotals[ages[userId]] += n
+            bucketTotals = Counter()
+            for age, n in ageTotals.items():
+                bucketTotals[age // 10] += n
+            _increment(session, AgeStat.__table__, 'age', ageTotals)
+            _increment(session, AgeBucketStat.__table__, 'bucket', bucketTotals)
+        # Журнал ошибок и сводки по часам и суткам для выборок за период
+        events = Counter()
+        for (normal, _, userId), n in counts.items():
+            events[mistakeIds[normal], userId] += n
+        session.execute(MistakeEvent.__table__.insert(),
+                        [{'time': now, 'mistake': mistakeId, 'user': userId, 'count': n}
+                         for (mistakeId, userId), n in events.items()])
+        periodTotals = Counter()
+        for (mistakeId, userId), n in events.items():
+            age = ages.get(userId)
+            periodTotals[mistakeId, NO_AGE if age is None else age] += n
+        _rollup(session, HourlyStat.__table__, now // HOUR, periodTotals)
+        _rollup(session, DailyStat.__table__, now // DAY, periodTotals)
+        _bump(session, [GLOBAL, *{userScope(userId) for userId, _ in userTotals}])
+        session.commit()
+        metrics.inc('ortho_rows_written_total', len(totals), table='mistakes')
+        metrics.inc('ortho_rows_written_total', len(languageTotals), table='language_stats')
+        metrics.inc('ortho_rows_written_total', len(userTotals), table='association')
+    finally:
+        session.close()
+    if now - __pruned >= PRUNE_INTERVAL:
+        __pruned = now
+        prune(now)
+
+
+def _findMistakes(session, names):
+    ''' Идентификаторы и языки ошибок по начальным формам.
+        Для повторяющихся имён берётся первая запись: SQLite возвращает столбцы
+        той строки, на которой достигается min '''
+    found = {}
+    for chunk in _chunks(names):
+        for name, mistakeId, language in (session.query(Mistake.name, func.min(Mistake.id), Mistake.language)
+                                          .filter(Mistake.name.in_(chunk))
+                                          .group_by(Mistake.name)):
+            found[name] = (mistakeId, language)
+    return found
+
+
+def _increment(session, table, key, counts):
+    ''' Прибавляет counts к счётчикам сводной таблицы, создавая недостающие строки '''
+    if not counts:
+        return
+    session.execute(table.insert().prefix_with('OR IGNORE'),
+                    [{key: value, 'count': 0} for value in counts])
+    session.execute(table.update()
+                    .where(table.c[key] == bindparam('value'))
+                    .values(count=table.c.count + bindparam('n')),
+                    [{'value': value, 'n': n} for value, n in counts.items()])
+
+
+def _rollup(session, table, period, counts):
+    ''' Прибавляет counts с ключами (id ошибки, возраст) к сводке за период period '''
+    session.execute(table.insert().prefix_with('OR IGNORE'),
+                    [{'period': period, 'mistake': mistakeId, 'age': age, 'count': 0}
+                     for mistakeId, age in counts])
+    session.execute(table.update()
+                    .where(table.c.period == period)
+                    .where(table.c.mistake == bindparam('mistakeId'))
+                    .where(table.c.age == bindparam('ageValue'))
+                    .values(count=table.c.count + bindparam('n')),
+                    [{'mistakeId': mistakeId, 'ageValue': age, 'n': n}
+                     for (mistakeId, age), n in counts.items()])
+
+
+def prune(now=None):
+    ''' Удаляет записи журнала старше EVENT_RETENTION и почасовые сводки старше HOURLY_RETENTION '''
+    now = now or time.time()
+    session = dbSession.createSession()
+    try:
+        session.execute(MistakeEvent.__table__.delete().where(MistakeEvent.time < now - EVENT_RETENTION))
+        session.execute(HourlyStat.__table__.delete()
+                        .where(HourlyStat.period < (now - HOURLY_RETENTION) // HOUR))
+        session.commit()
+    finally:
+        session.close()
+
+
+def userScope(userId):
+    ''' Имя версии статистики пользователя '''
+    return f'user:{userId}'
+
+
+def _bump(session, scopes):
+    ''' Увеличивает версии статистики, по которым кэшируются ответы '''
+    table = Generation.__table__
+    session.execute(table.insert().prefix_with('OR IGNORE'), [{'scope': scope, 'value': 0} for scope in scopes])
+    session.execute(table.update()
+                    .where(table.c.scope == bindparam('key'))
+                    .values(value=table.c.value + 1, changed=time.time()),
+                    [{'key': scope} for scope in scopes])
+
+
+def generation(scope=GLOBAL):
+    ''' Версия статистики и время её последнего изменения или (0, None), если записей не было '''
+    session = dbSession.createSession()
+    try:
+        row = session.query(Generation.value, Generation.changed).filter(Generation.scope == scope).first()
+    finally:
+        session.close()
+    return tuple(row) if row else (0, None)
+
+
+def rebuild():
+    ''' Пересчитывает сводные таблицы по таблицам mistakes и association '''
+    session = dbSession.createSession()
+    try:
+        session.execute(LanguageStat.__table__.delete())
+        session.execute(AgeStat.__table__.delete())
+        session.execute(AgeBucketStat.__table__.delete())
+        session.execute(LanguageStat.__table__.insert().from_select(
+            ['language', 'count'],
+            session.query(Mistake.language, func.sum(func.coalesce(Mistake.count, 0)))
+            .filter(Mistake.language.isnot(None))
+            .group_by(Mistake.language)))
+        byAge = (session.query(User.age, func.sum(func.coalesce(Association.count, 0)))
+                 .join(Association, Association.user == User.id)
+                 .filter(User.age.isnot(None))
+                 .group_by(User.age))
+        session.execute(AgeStat.__table__.insert().from_select(['age', 'count'], byAge))
+        bucket = (User.age / 10).label('bucket')  # Деление целых чисел в SQLite целочисленное
+        session.execute(AgeBucketStat.__table__.insert().from_select(
+            ['bucket', 'count'],
+            session.query(bucket, func.sum(func.coalesce(Association.count, 0)))
+            .join(Association, Association.user == User.id)
+            .filter(User.age.isnot(None))
+            .group_by(bucket)))
+        _bump(session, [GLOBAL])
+        session.commit()
+    finally:
+        session.close()
+
+
+def ensureRollups():
+    ''' Заполняет сводные таблицы, если они пусты, а статистика уже есть.
+        Нужно при первом запуске на существующей БД '''
+    session = dbSession.createSession()
+    try:
+        empty = session.query(LanguageStat).first() is None
+        hasData = session.query(Mistake).filter(Mistake.count > 0).first() is not None
+    finally:
+        session.close()
+    if empty and hasData:
+        rebuild()
+
+
+class StatsBuffer:
+    ''' Буфер счётчиков с отложенной записью в БД.
+        Если задан каталог spool, каждое добавление дописывается в файл процесса.
+        Файл заблокирован, пока процесс жив, поэтому файлы упавших процессов
+        подхватываются при запуске нового буфера. Запись в БД выполняется не реже
+        одного раза, после падения во время сброса счётчики могут учесться дважды.
+        Пока запись не удаётся, паузы между попытками растут вдвое до RETRY_LIMIT '''
+
+    def __init__(self, spool=None, interval=5, size=1000):
+        self.spool = spool
+        self.interval = interval
+        self.size = size
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        self.flushLock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.failures = 0  # Число неудачных сбросов подряд
+        self.file = None
+        self.rotated = []  # Файлы упавших процессов, содержимое которых ещё не записано в БД
+        self.pid = os.getpid()
+        if spool:
+            os.makedirs(spool, exist_ok=True)
+            self._recover()
+            self.file = self._open()
+        self.thread = threading.Thread(target=self._run, name='stats-buffer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _open(self):
+        return lockfile.create(self.spool, 'spool', '.jsonl', 'a+')
+
+    def _recover(self):
+        ''' Забирает счётчики из файлов процессов, которые завершились, не сбросив их '''
+        for path in glob.glob(os.path.join(self.spool, 'spool-*.jsonl')):
+            file = lockfile.claim(path)
+            if file is None:
+                continue  # Файл работающего процесса или уже обработан другим процессом
+            for line in file:
+                try:
+                    self.pending.update({tuple(key): n for *key, n in json.loads(line)})
+                except ValueError:
+                    pass  # Строка, недописанная при падении
+            self.rotated.append(file)
+
+    def add(self, counts):
+        with self.lock:
+            self.pending.update(counts)
+            if self.file is not None:
+                self.file.write(json.dumps([[*key, n] for key, n in counts.items()],
+                                           ensure_ascii=False) + '\n')
+                self.file.flush()
+            # Пока БД недоступна, поток не будится на каждое добавление и ждёт своей паузы
+            full = len(self.pending) >= self.size and not self.failures
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        ''' Записывает накопленные счётчики в БД '''
+        with self.flushLock:
+            with self.lock:
+                counts, self.pending = self.pending, Counter()
+                written = self.file.tell() if self.file is not None else 0
+            if not counts:
+                return
+            try:
+                write(counts)
+            except Exception:
+                with self.lock:
+                    self.pending.update(counts)  # Файл не меняется, в нём остаются все счётчики
+                raise
+            with self.lock:
+                # Файл заменяется только после записи: в новый переносятся строки,
+                # добавленные во время сброса
+                if self.file is not None:
+                    self.file.seek(written)
+                    rest = self.file.read()
+                    file = self._open()
+                    file.write(rest)
+                    file.flush()
+                    os.remove(self.file.name)
+                    self.file.close()
+                    self.file = file
+            for file in self.rotated:
+                os.remove(file.name)
+                file.close()
+            self.rotated = []
+
+    def _run(self):
+        while not self.stopped:
+            delay = min(self.interval * 2 ** min(self.failures, 16), RETRY_LIMIT)
+            self.wakeup.wait(max(self.interval, delay))
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Счётчики остаются в буфере и в файле до следующей попытки
+                self.failures += 1
+                metrics.inc('ortho_stats_flush_errors_total')
+                logger.exception('Не удалось записать статистику, неудачных попыток подряд: %d',
+                                 self.failures)
+            else:
+                self.failures = 0
+
+    def close(self):
+        ''' Останавливает фоновый поток и сбрасывает оставшиеся счётчики '''
+        self.stopped = True
+        self.wakeup.set()
+        self.flush()
+        if self.file is not None:
+            os.remove(self.file.name)
+            self.file.close()
+            self.file = None
+
+
+def getBuffer():
+    ''' Буфер текущего процесса. После fork в рабочем процессе создаётся новый '''
+    global __buffer
+    if __buffer is None or __buffer.pid != os.getpid():
+        with __bufferLock:
+            if __buffer is None or __buffer.pid != os.getpid():
+                __buffer = StatsBuffer(__settings['spool'], __settings['interval'], __settings['size'])
+    return __buffer
+
+
+def flush():
+    ''' Сбрасывает буфер текущего процесса, если он есть '''
+    if __buffer is not None and __buffer.pid == os.getpid():
+        __buffer.flush()
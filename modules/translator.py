@@ -1,12 +1,264 @@
+from collections import Counter
+from functools import lru_cache
+import math
+import os
+import threading
+import unicodedata
 import requests
+from modules import metrics, morphology
 
-''' Модуль Яндекс.Переводчика '''
+''' Модуль определения языка слова.
+    Язык определяется локально по алфавиту, словарю pymorphy2 и профилям буквенных триграмм,
+    API Яндекс.Переводчика можно подключить как запасной вариант '''
+
+UNKNOWN = 'und'  # Код ISO 639 для неопределённого языка
+CACHE_SIZE = 10000  # Максимальное число слов в кэше
+SMOOTHING = 0.01  # Сглаживание частот для триграмм, которых нет в образце
+MARGIN = 0.5  # Минимальный отрыв лучшего языка, при котором ответ считается уверенным
+
+# Алфавиты, по которым язык определяется однозначно
+SCRIPTS = {
+    'GREEK': 'el',
+    'ARMENIAN': 'hy',
+    'GEORGIAN': 'ka',
+    'HEBREW': 'he',
+    'ARABIC': 'ar',
+    'THAI': 'th',
+    'HANGUL': 'ko',
+    'HIRAGANA': 'ja',
+    'KATAKANA': 'ja',
+    'CJK': 'zh',
+}
+
+# Буквы, которые встречаются только в части языков своего алфавита
+LETTERS = {
+    'CYRILLIC': {
+        'ы': ('ru', 'be'), 'э': ('ru', 'be'), 'ё': ('ru', 'be'), 'ъ': ('ru', 'bg'),
+        'і': ('uk', 'be'), 'ї': ('uk',), 'є': ('uk',), 'ґ': ('uk',), 'ў': ('be',),
+        'щ': ('ru', 'uk', 'bg'), 'и': ('ru', 'uk', 'bg'),
+    },
+    'LATIN': {
+        'ß': ('de',), 'ä': ('de',), 'ö': ('de',), 'ü': ('de', 'es'),
+        'ñ': ('es',), 'á': ('es',), 'í': ('es', 'it'), 'ó': ('es', 'it'), 'ú': ('es', 'it'),
+        'é': ('fr', 'es', 'it'), 'è': ('fr', 'it'), 'ê': ('fr',), 'ç': ('fr',), 'à': ('fr', 'it'),
+        'â': ('fr',), 'ô': ('fr',), 'û': ('fr',), 'î': ('fr',), 'ù': ('fr', 'it'), 'ò': ('it',),
+    },
+}
+
+# Каталог с дополнительными образцами <язык>.txt. Коротких образцов из SAMPLES мало для
+# отдельных слов, без них частые русские и украинские слова путаются между собой
+SAMPLE_DIR = os.path.join(os.path.dirname(__file__), 'samples')
+
+# Образцы текста, по которым строятся профили триграмм
+SAMPLES = {
+    'CYRILLIC': {
+        'ru': 'Прогулка по саду была долгой и спокойной. Мы говорили о том, что видели '
+              'в городе, и о людях, которые живут рядом с нами. Вечером погода стала '
+              'холоднее, поэтому мы вернулись домой и пили чай. Каждый человек может '
+              'учиться писать без ошибок, если будет читать больше хороших книг. '
+              'Сегодня хорошая погода, завтра обещают дождь и сильный ветер. '
+              'Это первый раз, когда я пишу такое длинное сообщение своему другу.',
+        'uk': 'Прогулянка садом була довгою і спокійною. Ми говорили про те, що бачили '
+              'в місті, і про людей, які живуть поруч з нами. Увечері погода стала '
+              'холоднішою, тому ми повернулися додому і пили чай. Кожна людина може '
+              'навчитися писати без помилок, якщо читатиме більше добрих книжок. '
+              'Сьогодні гарна погода, завтра обіцяють дощ і сильний вітер. '
+              'Це перший раз, коли я пишу таке довге повідомлення своєму другові.',
+        'be': 'Прагулка па садзе была доўгай і спакойнай. Мы размаўлялі пра тое, што '
+              'бачылі ў горадзе, і пра людзей, якія жывуць побач з намі. Увечары '
+              'надвор\'е стала халадней, таму мы вярнуліся дадому і пілі гарбату. '
+              'Кожны чалавек можа навучыцца пісаць без памылак, калі будзе чытаць '
+              'больш добрых кніг. Сёння добрае надвор\'е, заўтра абяцаюць дождж.',
+        'bg': 'Разходката в градината беше дълга и спокойна. Говорихме за това, което '
+              'видяхме в града, и за хората, които живеят до нас. Вечерта времето стана '
+              'по-студено, затова се върнахме у дома и пихме чай. Всеки човек може да '
+              'се научи да пише без грешки, ако чете повече хубави книги. Днес времето '
+              'е хубаво, утре обещават дъжд и силен вятър.',
+    },
+    'LATIN': {
+        'en': 'The walk through the garden was long and quiet. We talked about what we '
+              'had seen in the city and about the people who live near us. In the '
+              'evening the weather became colder, so we went back home and drank tea. '
+              'Everyone can learn to write without mistakes if they read more good '
+              'books. Today the weather is nice, tomorrow they promise rain and strong '
+              'wind. This is the first time I have written such a long message.',
+        'de': 'Der Spaziergang durch den Garten war lang und ruhig. Wir sprachen über '
+              'das, was wir in der Stadt gesehen hatten, und über die Menschen, die '
+              'neben uns wohnen. Am Abend wurde das Wetter kälter, deshalb gingen wir '
+              'nach Hause und tranken Tee. Jeder Mensch kann lernen, ohne Fehler zu '
+              'schreiben, wenn er mehr gute Bücher liest. Heute ist das Wetter schön.',
+        'fr': 'La promenade dans le jardin était longue et calme. Nous avons parlé de ce '
+              'que nous avions vu dans la ville et des gens qui vivent près de chez '
+              'nous. Le soir, le temps est devenu plus froid, alors nous sommes rentrés '
+              'à la maison et avons bu du thé. Chacun peut apprendre à écrire sans '
+              'fautes s\'il lit plus de bons livres. Aujourd\'hui il fait beau.',
+        'es': 'El paseo por el jardín fue largo y tranquilo. Hablamos de lo que habíamos '
+              'visto en la ciudad y de la gente que vive cerca de nosotros. Por la '
+              'tarde el tiempo se volvió más frío, así que volvimos a casa y tomamos '
+              'té. Todo el mundo puede aprender a escribir sin errores si lee más '
+              'libros buenos. Hoy hace buen tiempo, mañana prometen lluvia y viento.',
+        'it': 'La passeggiata nel giardino era lunga e tranquilla. Abbiamo parlato di '
+              'quello che avevamo visto in città e delle persone che vivono vicino a '
+              'noi. La sera il tempo è diventato più freddo, quindi siamo tornati a '
+              'casa e abbiamo bevuto il tè. Ognuno può imparare a scrivere senza '
+              'errori se legge più libri buoni. Oggi fa bel tempo, domani piove.',
+    },
+}
+
+# Языки, среди которых выбирается ответ. Яндекс.Спеллер работает с русским, украинским
+# и английским, остальные профили можно подключить через setLanguages
+LANGUAGES = ('ru', 'uk', 'en')
+
+__profiles = None
+__lock = threading.Lock()
+__fallback = None
+__languages = LANGUAGES
+
+
+def _trigrams(word):
+    padded = f' {word} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _buildProfiles():
+    ''' Строит логарифмические частоты триграмм для каждого языка '''
+    profiles = {}
+    for script, samples in SAMPLES.items():
+        profiles[script] = {}
+        for lang, sample in samples.items():
+            path = os.path.join(SAMPLE_DIR, f'{lang}.txt')
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as file:
+                    sample = f'{sample} {file.read()}'
+            counts = Counter()
+            for word in sample.lower().split():
+                counts.update(_trigrams(word.strip('.,!?:;\'"')))
+            total = sum(counts.values()) + SMOOTHING * (len(counts) + 1)
+            profiles[script][lang] = ({gram: math.log((count + SMOOTHING) / total)
+                                       for gram, count in counts.items()},
+                                      math.log(SMOOTHING / total))
+    return profiles
+
+
+def getProfiles():
+    ''' Возвращает профили триграмм, строя их при первом обращении '''
+    global __profiles
+    if __profiles is None:
+        with __lock:
+            if __profiles is None:
+                __profiles = _buildProfiles()
+    return __profiles
+
+
+def _script(char):
+    ''' Название алфавита символа по его имени в Unicode '''
+    name = unicodedata.name(char, '')
+    if name.startswith('CJK'):
+        return 'CJK'
+    return name.split(' ', 1)[0]
+
+
+def _rank(lang):
+    ''' Порядок предпочтения при равенстве '''
+    return __languages.index(lang) if lang in __languages else len(__languages)
+
+
+def detect(word):
+    ''' Определяет язык слова локально. Возвращает пару (язык, уверенность) '''
+    word = word.lower()
+    scripts = Counter(_script(char) for char in word if char.isalpha())
+    if not scripts:
+        return UNKNOWN, False
+    script = scripts.most_common(1)[0][0]
+    if script in SCRIPTS:
+        return SCRIPTS[script], True
+    profiles = {lang: profile for lang, profile in getProfiles().get(script, {}).items()
+                if lang in __languages}
+    if not profiles:
+        return UNKNOWN, False
+    candidates = set(profiles)
+    for char in word:
+        if char in LETTERS.get(script, {}):
+            candidates &= set(LETTERS[script][char])
+    if not candidates:
+        candidates = set(profiles)
+    if len(candidates) == 1:
+        return candidates.pop(), True
+    # Слово из словаря pymorphy2 русское. Общие для русского и украинского слова
+    # тоже считаются русскими, триграммы на коротких словах ошибаются чаще
+    if 'ru' in candidates and script == 'CYRILLIC' and morphology.isKnown(word):
+        return 'ru', True
+    grams = _trigrams(''.join(char for char in word if char.isalpha()))
+    scores = {}
+    for lang in candidates:
+        logs, unseen = profiles[lang]
+        scores[lang] = sum(logs.get(gram, unseen) for gram in grams)
+    best = max(scores.values())
+    # Языки, которые близки к лучшему, считаются равными и выбираются по предпочтению
+    close = sorted((lang for lang in scores if best - scores[lang] < MARGIN * len(grams)),
+                   key=_rank)
+    return close[0], len(close) == 1
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _detect(word):
+    return detect(word)
+
+
+def detectCached(word):
+    ''' То же, что detect, но ответы для слов хранятся в кэше '''
+    return _detect(word.lower())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _getLanguage(word):
+    lang, confident = detectCached(word)
+    if not confident and __fallback is not None:
+        try:
+            with metrics.stage('translator_request'):
+                return __fallback(word) or lang
+        except (requests.RequestException, KeyError, ValueError):
+            metrics.inc('ortho_upstream_errors_total', service='translator')  # Запасной вариант недоступен, остаётся локальный ответ
+    return lang
 
 
 def getLanguage(text):
+    ''' Язык слова в виде кода ISO '''
+    return _getLanguage(text.lower())
+
+
+def detectLanguages(words):
+    ''' Определяет языки набора слов за один вызов. Каждое слово обрабатывается один раз '''
+    languages = {word: getLanguage(word) for word in set(words)}
+    return [languages[word] for word in words]
+
+
+def setFallback(backend):
+    ''' Подключает запасной способ определения языка для неуверенных ответов,
+        например yandexLanguage. None отключает его '''
+    global __fallback
+    __fallback = backend
+    _getLanguage.cache_clear()
+
+
+def hasFallback():
+    ''' Подключён ли запасной способ определения языка '''
+    return __fallback is not None
+
+
+def setLanguages(languages):
+    ''' Задаёт языки, среди которых выбирается ответ, в порядке предпочтения '''
+    global __languages
+    __languages = tuple(languages)
+    _detect.cache_clear()
+    _getLanguage.cache_clear()
+
+
+def yandexLanguage(text):
+    ''' Определение языка через API Яндекс.Переводчика '''
     url = 'https://translate.yandex.net/api/v1.5/tr.json/detect'
     params = {
         'key': 'trnsl.1.1.20200425T163049Z.df8faea63f55d3a5.63e0685f564e78f2f1731927d759911df3ea9eb8',
         'text': text
     }
-    return requests.get(url, params).json()['lang']
+    return requests.get(url, params, timeout=5).json()['lang']
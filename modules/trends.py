@@ -0,0 +1,70 @@
+from collections import Counter
+from sqlalchemy import func
+from data.mistakes import Mistake
+from data.languages import Language
+from data.mistakeEvents import HourlyStat, DailyStat, NO_AGE
+from modules.statistics import HOUR, DAY, HOURLY_RETENTION, CHUNK_SIZE
+import time
+
+''' Модуль статистики за период по почасовым и суточным сводкам.
+    Целые сутки периода берутся из суточной сводки, неполные - из почасовой,
+    поэтому время выборки зависит от длины периода, а не от объёма всей истории '''
+
+HOURS = DAY // HOUR
+
+
+def parts(since, until, now=None):
+    ''' Делит период [since, until) в секундах на части, которые читаются из сводок.
+        Возвращает тройки (сводка, первый период, период после последнего).
+        Часы, почасовые сводки по которым уже удалены, заменяются целыми сутками '''
+    now = now or time.time()
+    first = since // HOUR
+    last = -(-until // HOUR)  # Округление вверх
+    oldest = (now - HOURLY_RETENTION) // HOUR
+    if first < oldest:
+        first -= first % HOURS
+    if last <= oldest:
+        last += -last % HOURS
+    firstDay = -(-first // HOURS)
+    lastDay = last // HOURS
+    if firstDay >= lastDay:
+        return [(HourlyStat, first, last)] if first < last else []
+    result = [(HourlyStat, first, firstDay * HOURS), (DailyStat, firstDay, lastDay),
+              (HourlyStat, lastDay * HOURS, last)]
+    return [(table, start, end) for table, start, end in result if start < end]
+
+
+def _sum(session, since, until, key, *joins, filters=()):
+    ''' Складывает count сводок за период по ключу key(table) '''
+    totals = Counter()
+    for table, start, end in parts(since, until):
+        query = session.query(key(table), func.sum(table.count))
+        for join in joins:
+            query = join(query, table)
+        query = query.filter(table.period >= start, table.period < end, *(f(table) for f in filters))
+        for value, count in query.group_by(key(table)):
+            totals[value] += count
+    return totals
+
+
+def languages(session, since, until):
+    ''' Число ошибок по языкам за период '''
+    return _sum(session, since, until, lambda table: Language.acronym,
+                lambda query, table: query.join(Mistake, Mistake.id == table.mistake),
+                lambda query, table: query.join(Language, Language.id == Mistake.language))
+
+
+def ages(session, since, until):
+    ''' Число ошибок пользователей с известным возрастом по возрасту за период '''
+    return _sum(session, since, until, lambda table: table.age,
+                filters=[lambda table: table.age != NO_AGE])
+
+
+def top(session, since, until, limit):
+    ''' Самые частые ошибки за период: пары (начальная форма, число) '''
+    totals = _sum(session, since, until, lambda table: table.mistake).most_common(limit)
+    names = {}
+    ids = [mistakeId for mistakeId, _ in totals]
+    for i in range(0, len(ids), CHUNK_SIZE):
+        names.update(session.query(Mistake.id, Mistake.name).filter(Mistake.id.in_(ids[i:i + CHUNK_SIZE])))
+    return [(names.get(mistakeId), count) for mistakeId, count in totals]
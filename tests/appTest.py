@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+# Приложение создаётся в отдельном процессе: createApp подключает к модулям свою БД
+SCRIPT = '''
+import flask_app
+import sys
+
+config = {'DB_FILE': sys.argv[1], 'RESULT_STORE': None, 'PRELOAD': False}
+app = flask_app.createApp(**config)
+assert flask_app.createApp() is app and flask_app.createApp(**config) is app
+try:
+    flask_app.createApp(DB_FILE=sys.argv[1] + '.other')
+except RuntimeError as error:
+    print(error)
+'''
+
+
+def test_create_app(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', SCRIPT, str(tmp_path / 'ortho.db')],
+                            cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1].endswith('DB_FILE')
@@ -0,0 +1,39 @@
+from collections import Counter
+from flask import Flask
+from flask_restful import Api
+from api import beautifierResources
+from modules import speller, statistics
+import json
+
+
+def test_batch(monkeypatch):
+    checked = []
+    written = []
+
+    def getMistakes(text):
+        checked.append(text)
+        if text == 'сбой':
+            raise speller.SpellerError('Спеллер не ответил')
+        pos = text.find('Прагулка')
+        return [{'pos': pos, 'len': 8, 's': ['Прогулка']}] if pos >= 0 else []
+
+    monkeypatch.setattr(speller, 'getMistakes', getMistakes)
+    monkeypatch.setattr(statistics, 'recordCounts', written.append)
+    texts = ['Прагулка', 'Всё верно', 'сбой', 'Прагулка']
+    lines = [json.loads(line) for line in beautifierResources.correctBatch(texts)]
+    assert [line['index'] for line in lines] == [0, 1, 2, 3]
+    assert lines[0]['corrected_text'] == lines[3]['corrected_text'] == 'Прогулка'
+    assert 'message' in lines[2]
+    assert sorted(checked) == sorted(set(texts))
+    assert written == [Counter({('прогулка', 'ru', None): 2})]
+
+
+def test_batch_limit(monkeypatch):
+    app = Flask(__name__)
+    Api(app).add_resource(beautifierResources.BeautifierBatchResource, '/api/beautifier/batch')
+    monkeypatch.setattr(speller, 'getMistakes', lambda text: [])
+    monkeypatch.setattr(statistics, 'recordCounts', lambda counts: None)
+    client = app.test_client()
+    texts = ['текст'] * beautifierResources.MAX_BATCH
+    assert client.post('/api/beautifier/batch', json={'texts': texts}).status_code == 200
+    assert client.post('/api/beautifier/batch', json={'texts': texts + ['текст']}).status_code == 413
@@ -0,0 +1,68 @@
+from flask import Flask
+from flask_restful import Api
+from api import beautifierResources
+from modules import speller, statistics
+import io
+import json
+import pytest
+
+# Документ из нескольких окон: в каждом предложении одна ошибка, в последнем спеллер падает
+SENTENCE = 'Прагулка по парку. '
+DOCUMENT = SENTENCE * 4
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def getMistakes(text):
+        if 'сбой' in text:
+            raise speller.SpellerError('Спеллер не ответил')
+        pos = text.find('Прагулка')
+        return [{'pos': pos, 'len': 8, 's': ['Прогулка']}] if pos >= 0 else []
+
+    monkeypatch.setattr(speller, 'getMistakes', getMistakes)
+    monkeypatch.setattr(speller, 'CHUNK_SIZE', len(SENTENCE))
+    monkeypatch.setattr(beautifierResources, 'READ_SIZE', 7)  # Блоки делят буквы UTF-8 пополам
+    monkeypatch.setattr(statistics, 'record', lambda normals, userId=None: None)
+    app = Flask(__name__)
+    Api(app).add_resource(beautifierResources.BeautifierResource, '/api/beautifier')
+    return app.test_client()
+
+
+def lines(response):
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def check(result, document):
+    assert len(result) == document.count('Прагулка') > 1
+    assert ''.join(line['corrected_text'] for line in result) == document.replace('Прагулка', 'Прогулка')
+    positions = [m['pos'] for line in result for m in line['mistakes']]
+    assert positions == [i * len(SENTENCE) for i in range(len(result))]
+    assert all(document[pos:pos + 8] == 'Прагулка' for pos in positions)
+
+
+def test_upload(client):
+    data = {'file': (io.BytesIO(DOCUMENT.encode()), 'document.txt')}
+    check(lines(client.post('/api/beautifier', data=data, content_type='multipart/form-data')), DOCUMENT)
+
+
+def test_body(client):
+    response = client.post('/api/beautifier', data=DOCUMENT.encode(), content_type='text/plain')
+    check(lines(response), DOCUMENT)
+
+
+def test_speller_error(client):
+    document = SENTENCE * 2 + 'Тут сбой спеллера. ' + SENTENCE
+    result = lines(client.post('/api/beautifier', data=document.encode(), content_type='text/plain'))
+    # После сбоя поток заканчивается строкой с сообщением и смещением окна
+    assert [line.get('message') for line in result] == [None, None, 'Speller is unavailable']
+    assert result[-1]['offset'] == 2 * len(SENTENCE)
+    check(result[:-1], SENTENCE * 2)
+
+
+@pytest.mark.parametrize('options, status', [
+    ({'data': {'text': DOCUMENT}}, 415),
+    ({'data': {}, 'content_type': 'multipart/form-data'}, 400),
+])
+def test_bad_request(client, options, status):
+    assert client.post('/api/beautifier', **options).status_code == status
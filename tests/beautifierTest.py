@@ -1,6 +1,14 @@
-from requests import get
+from requests import get, post
 
 print(get('http://localhost:5000/api/beautifier').json())  # Ошибка - нет текста
 
 # Вернет откорректированный текст и набор ошибок. Данные ошибок добавятся в БД
 print(get('http://localhost:5000/api/beautifier', json={'text': 'Прагулка по полисаднику'}).json())
+
+# Пакет текстов. Ответ приходит построчно в формате NDJSON в порядке текстов
+print(post('http://localhost:5000/api/beautifier/batch',
+           json={'texts': ['Прагулка по полисаднику', 'Всё правильно', 'Прагулка по полисаднику']}).text)
+
+# Документ любой длины. Ответ приходит по окнам текста в формате NDJSON, позиции ошибок - в документе
+print(post('http://localhost:5000/api/beautifier', data='Прагулка по полисаднику. '.encode() * 1000,
+           headers={'Content-Type': 'text/plain; charset=utf-8'}).text[:1000])
@@ -0,0 +1,32 @@
+from modules import cache
+import time
+
+
+def test_lru_eviction():
+    lru = cache.LRUCache(maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert lru.get('b') is None
+    assert lru.get('a') == 1 and lru.get('c') == 3
+    assert lru.stats()['hits'] == 3 and lru.stats()['misses'] == 1
+
+
+def test_lru_ttl():
+    lru = cache.LRUCache(ttl=0.01)
+    lru.set('a', 1)
+    time.sleep(0.02)
+    assert lru.get('a') is None
+
+
+def test_sqlite_shared(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first = cache.SqliteCache(path, maxsize=2)
+    second = cache.SqliteCache(path, maxsize=2)
+    first.set('a', [{'pos': 1}])
+    assert second.get('a') == [{'pos': 1}]
+    first.set('b', [])
+    first.set('c', [])
+    first.evict()
+    assert first.stats()['size'] == 2
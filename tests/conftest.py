@@ -0,0 +1,9 @@
+from data import dbSession
+import pytest
+
+
+@pytest.fixture(scope='session')
+def db(tmp_path_factory):
+    ''' Временная база данных, общая для всех тестов '''
+    dbSession.globalInit(str(tmp_path_factory.mktemp('db') / 'ortho.db'))
+    return dbSession
@@ -0,0 +1,89 @@
+from modules import corrector, translator
+from modules.corrector import applyCorrections
+import random
+import time
+
+
+def legacyCorrections(text, mistakes):
+    ''' Прежний алгоритм исправления: замена срезов со сдвигом delta '''
+    corrected = text
+    delta = 0
+    for m in mistakes:
+        correct = m['s'][0]
+        wrong = text[m['pos']:m['pos'] + m['len']]
+        corrected = corrected[:m['pos'] + delta] + correct + corrected[m['pos'] + m['len'] + delta:]
+        delta += len(correct) - len(wrong)
+    return corrected
+
+
+def mistake(pos, length, correct):
+    return {'pos': pos, 'len': length, 's': [correct]}
+
+
+def test_simple():
+    text = 'Прагулка по полисаднику'
+    mistakes = [mistake(0, 8, 'Прогулка'), mistake(12, 11, 'палисаднику')]
+    assert applyCorrections(text, mistakes) == 'Прогулка по палисаднику'
+    assert applyCorrections(text, mistakes) == legacyCorrections(text, mistakes)
+
+
+def test_adjacent():
+    text = 'абвгдеж'
+    mistakes = [mistake(0, 2, 'X'), mistake(2, 2, 'YYY'), mistake(4, 0, 'Z'), mistake(4, 3, '')]
+    assert applyCorrections(text, mistakes) == legacyCorrections(text, mistakes)
+
+
+def test_overlapping():
+    text = 'абвгдежзий'
+    mistakes = [mistake(1, 4, 'XY'), mistake(3, 4, 'ZZZZZ'), mistake(2, 1, 'Q'), mistake(8, 10, 'W')]
+    assert applyCorrections(text, mistakes) == legacyCorrections(text, mistakes)
+
+
+def test_random():
+    rand = random.Random(0)
+    for _ in range(20000):
+        text = ''.join(rand.choice('абв ') for _ in range(rand.randint(0, 20)))
+        mistakes = [mistake(rand.randint(0, len(text) + 2), rand.randint(0, 5),
+                            ''.join(rand.choice('XY') for _ in range(rand.randint(0, 4))))
+                    for _ in range(rand.randint(0, 6))]
+        if rand.random() < 0.5:
+            mistakes.sort(key=lambda m: m['pos'])
+        assert applyCorrections(text, mistakes) == legacyCorrections(text, mistakes)
+
+
+def test_lookup():
+    normals, languages = corrector.lookup(['Прогулка', 'прогулка', 'walks'])
+    assert normals == {'прогулка': 'прогулка', 'walks': 'walks'}
+    assert languages == {'прогулка': 'ru', 'walks': 'en'}
+
+
+def test_lookup_timeout(monkeypatch):
+    calls = []
+
+    def slow(word):
+        calls.append(word)
+        time.sleep(0.3)
+        return 'be'
+    # Все слова, кроме уверенно определённых, отправляются в медленный запасной сервис
+    monkeypatch.setattr(translator, 'detectCached', lambda word: ('ru', word == 'быстро'))
+    translator.setFallback(slow)
+    try:
+        words = ['быстро'] + [f'медленно{i}' for i in range(3 * corrector.WORKERS)]
+        started = time.monotonic()
+        _, languages = corrector.lookup(words, timeout=0.1)
+        assert time.monotonic() - started < 0.25
+        assert languages == {'быстро': 'ru'}  # Слов без ответа в словаре нет
+        time.sleep(0.5)
+        assert len(calls) == corrector.WORKERS  # Задачи из очереди отменены
+        _, languages = corrector.lookup(['медленно0'], timeout=0.1)
+        assert languages == {'медленно0': 'be'}  # Ответ завершившейся задачи взят из кэша
+    finally:
+        translator.setFallback(None)
+
+
+def test_enrich_timeout(monkeypatch):
+    monkeypatch.setattr(corrector, 'lookup', lambda words: ({'прогулка': 'прогулка', 'сад': 'сад'},
+                                                            {'сад': 'ru'}))
+    _, tablelist, normals = corrector.enrich('прагулка сат', [mistake(0, 8, 'прогулка'), mistake(9, 3, 'сад')])
+    assert [row['lang'] for row in tablelist] == [translator.UNKNOWN, 'ru']
+    assert normals == [('сад', 'ru')]  # Слово без языка не попадает в статистику
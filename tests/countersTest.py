@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from data.users import User
+from data.mistakes import Mistake
+from data.association import Association
+from data.languageStats import LanguageStat
+from data.ageStats import AgeStat, AgeBucketStat
+from modules import statistics
+import atexit
+import pytest
+
+
+def test_record(db):
+    session = db.createSession()
+    user = User(email='counters@test', age=30, token='counters')
+    session.add(user)
+    session.commit()
+    statistics.record([('прогулка', 'ru'), ('палисадник', 'ru'), ('прогулка', 'ru')], user.id)
+    statistics.record([('прогулка', 'ru'), ('garden', 'en')])
+    counts = dict(session.query(Mistake.name, Mistake.count))
+    assert counts['прогулка'] == 3 and counts['палисадник'] == 1 and counts['garden'] == 1
+    associations = dict(session.query(Mistake.name, Association.count)
+                        .join(Association, Association.mistake == Mistake.id)
+                        .filter(Association.user == user.id))
+    assert associations == {'прогулка': 2, 'палисадник': 1}
+    session.close()
+
+
+def test_concurrent(db):
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: statistics.record([('конкурент', 'ru')]), range(40)))
+    session = db.createSession()
+    assert session.query(Mistake.count).filter(Mistake.name == 'конкурент').all() == [(40,)]
+    session.close()
+
+
+def test_buffered(db, tmp_path):
+    buffer = statistics.StatsBuffer(str(tmp_path), interval=3600, size=1000)
+    buffer.add({('буфер', 'ru', None): 2})
+    buffer.add({('буфер', 'ru', None): 1})
+    session = db.createSession()
+    assert session.query(Mistake).filter(Mistake.name == 'буфер').count() == 0
+    buffer.flush()
+    assert session.query(Mistake.count).filter(Mistake.name == 'буфер').scalar() == 3
+    buffer.close()
+    assert not list(tmp_path.iterdir())
+    session.close()
+
+
+def test_spool_recovery(db, tmp_path):
+    crashed = statistics.StatsBuffer(str(tmp_path), interval=3600)
+    crashed.add({('спул', 'ru', None): 4})
+    # Процесс упал: блокировка файла снята, буфер не сброшен
+    atexit.unregister(crashed.close)
+    crashed.stopped = True
+    crashed.file.close()
+    buffer = statistics.StatsBuffer(str(tmp_path), interval=3600)
+    buffer.close()
+    session = db.createSession()
+    assert session.query(Mistake.count).filter(Mistake.name == 'спул').scalar() == 4
+    session.close()
+
+
+def test_failed_flush(db, tmp_path, monkeypatch):
+    def unavailable(counts):
+        raise OSError('database is locked')
+
+    buffer = statistics.StatsBuffer(str(tmp_path), interval=3600, size=1)
+    write = statistics.write
+    monkeypatch.setattr(statistics, 'write', unavailable)
+    for _ in range(50):
+        buffer.add({('недоступна', 'ru', None): 1})
+        with pytest.raises(OSError):
+            buffer.flush()
+    # Неудачные сбросы не открывают новых файлов, все счётчики остаются в одном
+    assert len(list(tmp_path.iterdir())) == 1 and not buffer.rotated
+    assert len(open(buffer.file.name).readlines()) == 50
+    buffer.failures = 1
+    buffer.wakeup.clear()
+    buffer.add({('недоступна', 'ru', None): 1})
+    assert not buffer.wakeup.is_set()
+    monkeypatch.setattr(statistics, 'write', write)
+    buffer.flush()
+    assert open(buffer.file.name).read() == ''
+    buffer.close()
+    assert not list(tmp_path.iterdir())
+    session = db.createSession()
+    assert session.query(Mistake.count).filter(Mistake.name == 'недоступна').scalar() == 51
+    session.close()
+
+
+def test_rollups(db):
+    session = db.createSession()
+    user = User(email='rollups@test', age=42, token='rollups')
+    session.add(user)
+    session.commit()
+    statistics.record([('сводка', 'ru'), ('summary', 'en')], user.id)
+
+    def rollups():
+        return (sorted(session.query(LanguageStat.language, LanguageStat.count)),
+                sorted(session.query(AgeStat.age, AgeStat.count)),
+                sorted(session.query(AgeBucketStat.bucket, AgeBucketStat.count)))
+
+    incremental = rollups()
+    assert (42, 2) in incremental[1] and (4, 2) in incremental[2]
+    statistics.rebuild()
+    session.expire_all()
+    assert rollups() == incremental
+    session.close()
@@ -0,0 +1,13 @@
+def test_scoped_session(db):
+    session = db.getSession()
+    assert db.getSession() is session
+    db.removeSession()
+    assert db.getSession() is not session
+    db.removeSession()
+
+
+def test_engine_options(db):
+    session = db.createSession()
+    assert session.execute('PRAGMA journal_mode').scalar() == 'wal'
+    assert session.execute('PRAGMA busy_timeout').scalar() == db.ENGINE_OPTIONS['busy_timeout']
+    session.close()
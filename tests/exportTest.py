@@ -0,0 +1,78 @@
+from collections import Counter
+from flask import Flask
+from flask_restful import Api
+from data import dbSession
+from data.users import User
+from api import mistakesResources
+from modules import export, statistics
+import csv
+import io
+import json
+import pytest
+
+
+@pytest.fixture(scope='module')
+def userId(db):
+    session = db.createSession()
+    user = User(name='Выгрузка', age=42, token='export-token')
+    session.add(user)
+    session.commit()
+    userId = user.id
+    session.close()
+    statistics.write(Counter({('выгрузка', 'xx', userId): 2, ('экспорт', 'xx', None): 3,
+                              ('другой', 'yy', userId): 1}))
+    return userId
+
+
+def test_rows(userId):
+    rows = sorted(export.iterRows(lang='xx'))
+    assert rows == [('выгрузка', 'xx', 2, userId, 42, 2), ('экспорт', 'xx', 3, None, None, None)]
+
+
+def test_user_filter(userId):
+    rows = sorted(export.iterRows(userId=userId))
+    assert [(row[0], row[5]) for row in rows] == [('выгрузка', 2), ('другой', 1)]
+
+
+def test_formats(userId, monkeypatch):
+    monkeypatch.setattr(export, 'BATCH_SIZE', 1)
+    pieces = list(export.export(export.CSV, lang='xx'))
+    assert len(pieces) > 2  # Текст отдаётся по частям
+    table = list(csv.reader(io.StringIO(''.join(pieces))))
+    assert table[0] == list(export.COLUMNS)
+    assert sorted(table[1:]) == [['выгрузка', 'xx', '2', str(userId), '42', '2'],
+                                 ['экспорт', 'xx', '3', '', '', '']]
+    lines = ''.join(export.export(export.NDJSON, lang='yy')).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'mistake': 'другой', 'lang': 'yy', 'total': 1, 'user': userId, 'age': 42, 'count': 1}]
+
+
+def test_global_only(userId):
+    rows = sorted(export.iterRows(lang='xx', perUser=False))
+    assert rows == [('выгрузка', 'xx', 2, None, None, None), ('экспорт', 'xx', 3, None, None, None)]
+
+
+def test_endpoint(userId):
+    app = Flask(__name__)
+    Api(app).add_resource(mistakesResources.MistakesExportResource, '/api/mistakes/export')
+    app.teardown_appcontext(dbSession.removeSession)
+    client = app.test_client()
+    rows = [json.loads(line) for line in
+            client.get('/api/mistakes/export', json={'lang': 'yy'}).get_data(as_text=True).splitlines()]
+    assert rows == [{'mistake': 'другой', 'lang': 'yy', 'total': 1, 'user': None, 'age': None, 'count': None}]
+    response = client.get('/api/mistakes/export', json={'token': 'export-token', 'lang': 'yy'})
+    assert json.loads(response.get_data(as_text=True))['user'] == userId
+
+
+@pytest.mark.parametrize('lang', [None, 'xx'])
+def test_plan(db, lang):
+    # Строки читаются по индексам в нужном порядке: без временных индексов, сортировки
+    # и полного просмотра association на каждую ошибку
+    session = db.createSession()
+    try:
+        statement = export.rowsQuery(session, lang).statement.compile(compile_kwargs={'literal_binds': True})
+        plan = ' '.join(row[-1] for row in session.execute(f'EXPLAIN QUERY PLAN {statement}'))
+    finally:
+        session.close()
+    assert 'ix_association_mistake' in plan
+    assert 'TEMP B-TREE' not in plan and 'AUTOMATIC' not in plan and 'SCAN association' not in plan
@@ -0,0 +1,15 @@
+from modules import lockfile
+import os
+
+
+def test_lockfile(tmp_path):
+    file = lockfile.create(str(tmp_path), 'test', '.lock')
+    assert os.path.basename(file.name).startswith(f'test-{os.getpid()}-')
+    assert lockfile.alive(file.name) and lockfile.claim(file.name) is None
+    file.close()  # Процесс завершился, блокировка снята
+    assert not lockfile.alive(file.name)
+    claimed = lockfile.claim(file.name)
+    assert claimed is not None and lockfile.claim(file.name) is None
+    os.remove(claimed.name)
+    claimed.close()
+    assert lockfile.claim(file.name) is None and not lockfile.alive(file.name)
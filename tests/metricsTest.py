@@ -0,0 +1,77 @@
+from modules import metrics
+import os
+import pytest
+
+
+@pytest.fixture
+def enabled():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.enable(False)
+    metrics.reset()
+
+
+def test_disabled():
+    metrics.reset()
+    with metrics.stage('speller'):
+        pass
+    metrics.inc('ortho_requests_total')
+    assert metrics.render() == '\n'
+
+
+def test_render(enabled):
+    metrics.observe('ortho_stage_seconds', 0.003, stage='speller')
+    metrics.observe('ortho_stage_seconds', 20, stage='speller')
+    metrics.inc('ortho_upstream_errors_total', service='speller')
+    metrics.add('ortho_requests_in_flight', 1)
+    lines = metrics.render().splitlines()
+    assert '# TYPE ortho_stage_seconds histogram' in lines
+    assert 'ortho_stage_seconds_bucket{stage="speller",le="0.0025"} 0' in lines
+    assert 'ortho_stage_seconds_bucket{stage="speller",le="0.005"} 1' in lines
+    assert 'ortho_stage_seconds_bucket{stage="speller",le="+Inf"} 2' in lines
+    assert 'ortho_stage_seconds_count{stage="speller"} 2' in lines
+    assert 'ortho_upstream_errors_total{service="speller"} 1' in lines
+    assert 'ortho_requests_in_flight 1' in lines
+
+
+def test_server_timing(enabled):
+    @metrics.timed('db_write')
+    def write():
+        pass
+
+    token = metrics.begin()
+    with metrics.stage('speller'):
+        pass
+    write()
+    write()
+    header = metrics.serverTiming()
+    assert [item.split(';')[0] for item in header.split(', ')] == ['speller', 'db_write']
+    assert metrics.end(token).keys() == {'speller', 'db_write'}
+    assert metrics.serverTiming() == ''
+    assert 'ortho_stage_seconds_count{stage="db_write"} 2' in metrics.render().splitlines()
+
+
+def test_directory(enabled, tmp_path):
+    enabled.setDirectory(str(tmp_path))
+    try:
+        metrics.inc('ortho_requests_total', 2)
+        metrics.add('ortho_requests_in_flight', 1)
+        pid = os.fork()
+        if pid == 0:
+            # Рабочий процесс начинает с нуля и сохраняет свои значения
+            metrics.inc('ortho_requests_total')
+            metrics.add('ortho_requests_in_flight', 5)
+            metrics.observe('ortho_request_seconds', 0.003)
+            metrics.render()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        lines = metrics.render().splitlines()
+        assert 'ortho_requests_total 3' in lines  # Счётчики завершившегося процесса остаются
+        assert 'ortho_requests_in_flight 1' in lines  # Текущие значения - только работающих
+        assert 'ortho_request_seconds_count 1' in lines
+        assert len(list(tmp_path.glob('metrics-*.json'))) == 2
+        enabled.setDirectory(str(tmp_path))  # Файлы завершившихся процессов удаляются при запуске
+        assert 'ortho_requests_total 2' in metrics.render().splitlines()
+    finally:
+        enabled.setDirectory(None)
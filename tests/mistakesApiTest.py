@@ -0,0 +1,99 @@
+from collections import Counter
+from flask import Flask
+from flask_restful import Api
+from data import dbSession
+from data.users import User
+from api import mistakesResources
+from modules import responseCache, statistics
+import pytest
+
+# Число ошибок по словам. У слов с одинаковым числом порядок задаёт id
+COUNTS = {'первая': 3, 'вторая': 2, 'третья': 2, 'четвёртая': 2, 'пятая': 1, 'шестая': 1, 'седьмая': 1}
+LANG = 'mq'  # Язык, которого нет в других тестах
+
+
+@pytest.fixture(scope='module')
+def userId(db):
+    session = db.createSession()
+    user = User(name='Страницы', age=20, token='pages-token')
+    session.add(user)
+    session.commit()
+    userId = user.id
+    session.close()
+    for name, count in COUNTS.items():  # По одной записи, чтобы id шли в порядке COUNTS
+        statistics.write(Counter({(name, LANG, None): count}))
+    statistics.write(Counter({('вторая', LANG, userId): 1, ('пятая', LANG, userId): 4,
+                              ('чужая', 'mz', None): 5}))
+    return userId
+
+
+@pytest.fixture
+def client(userId):
+    responseCache.clear()
+    app = Flask(__name__)
+    api = Api(app)
+    api.add_resource(mistakesResources.MistakesResouce, '/api/mistakes')
+    app.teardown_appcontext(dbSession.removeSession)
+    return app.test_client()
+
+
+def pages(client, **query):
+    ''' Все страницы выдачи по курсорам из поля next '''
+    result = []
+    while True:
+        page = client.get('/api/mistakes', json=query).get_json()
+        result.append(page)
+        if page['next'] is None:
+            return result
+        query['after'] = page['next']
+
+
+def test_top_pages(client):
+    result = pages(client, top=2, lang=LANG)
+    names = [(m['name'], m['count']) for page in result for m in page['mistakes']]
+    # У слов, которые встретились и у пользователя, общее число больше
+    assert names == [('пятая', 5), ('первая', 3), ('вторая', 3), ('третья', 2), ('четвёртая', 2),
+                     ('шестая', 1), ('седьмая', 1)]
+    assert all(len(page['mistakes']) == 2 for page in result[:-1])
+
+
+def test_limit_pages(client):
+    result = pages(client, limit=3, lang=LANG)
+    assert [len(page['mistakes']) for page in result] == [3, 3, 1]
+    assert [m['name'] for page in result for m in page['mistakes']] == list(COUNTS)
+
+
+def test_lang(client):
+    mistakes = client.get('/api/mistakes', json={'lang': 'mz'}).get_json()['mistakes']
+    assert mistakes == [{'name': 'чужая', 'count': 5, 'lang': 'mz'}]
+    assert 'next' not in client.get('/api/mistakes', json={'lang': LANG}).get_json()
+
+
+def test_token(client):
+    result = pages(client, top=1, token='pages-token')
+    assert [(m['name'], m['count']) for page in result for m in page['mistakes']] == [('пятая', 4),
+                                                                                      ('вторая', 1)]
+    assert client.get('/api/mistakes', json={'token': 'wrong'}).status_code == 404
+
+
+@pytest.mark.parametrize('query', [{'top': 2, 'after': 'x'}, {'top': 2, 'after': '5'},
+                                   {'limit': 2, 'after': '1:2'}, {'limit': 0},
+                                   {'top': mistakesResources.MAX_PAGE + 1}])
+def test_bad_request(client, query):
+    response = client.get('/api/mistakes', json=query)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('after', [None, '2:3'])
+def test_plan(db, after):
+    # Самые частые ошибки языка читаются по индексу в порядке выдачи, без сортировки
+    session = db.createSession()
+    try:
+        args = {'top': 10, 'limit': None, 'lang': LANG, 'after': after}
+        statement = mistakesResources.mistakesQuery(session, args, None).statement.compile(
+            compile_kwargs={'literal_binds': True})
+        plan = ' '.join(row[-1] for row in session.execute(f'EXPLAIN QUERY PLAN {statement}'))
+    finally:
+        session.close()
+    assert 'ix_mistakes_language_count' in plan
+    assert 'TEMP B-TREE' not in plan and 'AUTOMATIC' not in plan
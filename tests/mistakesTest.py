@@ -4,3 +4,9 @@ print(get('http://localhost:5000/api/mistakes').json())  # Глобальная
 
 # Локальная статистика. Для проверки нужно пройти регистрацию и ввести свой токен
 print(get('http://localhost:5000/api/mistakes', json={'token': 'usertoken'}).json())
+
+print(get('http://localhost:5000/api/mistakes', json={'top': 10}).json())  # 10 самых частых ошибок
+# Постраничная выдача английских ошибок. Следующая страница запрашивается с курсором из поля next
+page = get('http://localhost:5000/api/mistakes', json={'limit': 100, 'lang': 'en'}).json()
+print(page)
+print(get('http://localhost:5000/api/mistakes', json={'limit': 100, 'lang': 'en', 'after': page['next']}).json())
@@ -0,0 +1,15 @@
+from modules import morphology
+
+
+def test_shared_analyzer():
+    assert morphology.getMorph() is morphology.getMorph()
+
+
+def test_normal_form_cached():
+    before = morphology.cacheInfo()
+    assert morphology.normalForm('палисаднику') == 'палисадник'
+    assert morphology.normalForm('Палисаднику') == 'палисадник'
+    after = morphology.cacheInfo()
+    assert after['misses'] - before['misses'] <= 1
+    assert after['hits'] - before['hits'] >= 1
+    assert 0.0 < after['hitRate'] <= 1.0
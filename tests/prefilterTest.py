@@ -0,0 +1,35 @@
+from modules import prefilter
+
+
+def test_known_words_dropped():
+    assert prefilter.fragments('Сегодня хорошая погода, завтра дождь.') == []
+
+
+def test_context():
+    text = 'Утром мы пошли на прагулку к реке.'
+    start, end = prefilter.fragments(text)[0]
+    assert text[start:end] == 'на прагулку к'
+
+
+def test_merge_neighbours():
+    text = 'Прагулка по полисаднику была долгой.'
+    assert [text[start:end] for start, end in prefilter.fragments(text)] == ['Прагулка по полисаднику была']
+
+
+def test_allowlist():
+    prefilter.setAllowlist(['Прагулка'])
+    try:
+        assert prefilter.fragments('прагулка была долгой') == []
+    finally:
+        prefilter.setAllowlist([])
+
+
+def test_restore():
+    text = 'Утром мы пошли гулять.\nВечером была прагулка по полисаднику.'
+    reduced, offsets = prefilter.reduce(text)
+    mistakes = [{'pos': reduced.find(word), 'row': 0, 'col': 0, 'len': len(word), 'word': word}
+                for word in ('прагулка', 'полисаднику')]
+    for m in prefilter.restore(mistakes, text, offsets):
+        assert text[m['pos']:m['pos'] + m['len']] == m['word']
+        assert m['row'] == 1
+        assert m['col'] == m['pos'] - text.index('\n') - 1
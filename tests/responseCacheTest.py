@@ -0,0 +1,46 @@
+from collections import Counter
+from flask import Flask, jsonify
+from modules import responseCache, statistics
+import pytest
+
+
+@pytest.fixture
+def client(db):
+    responseCache.clear()
+    app = Flask(__name__)
+    built = []
+
+    @app.route('/stats/<int:userId>')
+    def stats(userId):
+        def build():
+            built.append(userId)
+            return jsonify({'builds': len(built)})
+        return responseCache.cachedResponse(build, statistics.userScope(userId))
+
+    client = app.test_client()
+    client.built = built
+    return client
+
+
+def test_not_modified(client):
+    first = client.get('/stats/1')
+    assert first.status_code == 200
+    assert client.get('/stats/1').get_json() == {'builds': 1}
+    response = client.get('/stats/1', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.built == [1]
+
+
+def test_generation(client):
+    first = client.get('/stats/2')
+    before = statistics.generation(statistics.userScope(2))
+    statistics.write(Counter({('генерация', 'ru', None): 1}))
+    assert statistics.generation(statistics.userScope(2)) == before  # Записи без пользователя
+    statistics.write(Counter({('генерация', 'ru', 2): 1}))
+    assert statistics.generation(statistics.userScope(2))[0] == before[0] + 1
+    response = client.get('/stats/2', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert response.last_modified is not None
+    assert client.built == [2, 2]
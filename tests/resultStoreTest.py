@@ -0,0 +1,10 @@
+from modules import resultStore, cache
+
+
+def test_save_load(tmp_path):
+    resultStore.setStore(cache.SqliteCache(str(tmp_path / 'results.db'), table='results'))
+    resultId = resultStore.save('Прогулка', [{'wrong': 'прагулка', 'correct': 'прогулка',
+                                              'pos': 0, 'lang': 'ru'}])
+    assert len(resultId) < 16
+    assert resultStore.load(resultId)['text'] == 'Прогулка'
+    assert resultStore.load('missing') is None
@@ -0,0 +1,133 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from modules import speller, cache
+import json
+import threading
+import pytest
+
+WRONG = {'Прагулка': 'Прогулка', 'полисаднику': 'палисаднику'}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    ''' Заглушка Яндекс.Спеллера: исправляет слова из WRONG '''
+    failures = 0
+    texts = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        text = parse_qs(body)['text'][0]
+        StubHandler.texts.append(text)
+        if StubHandler.failures:
+            StubHandler.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        mistakes = []
+        for wrong, correct in WRONG.items():
+            pos = text.find(wrong)
+            while pos >= 0:
+                mistakes.append({'code': 1, 'pos': pos, 'row': text.count('\n', 0, pos),
+                                 'col': pos - text.rfind('\n', 0, pos) - 1, 'len': len(wrong),
+                                 'word': wrong, 's': [correct]})
+                pos = text.find(wrong, pos + 1)
+        mistakes.sort(key=lambda m: m['pos'])
+        data = json.dumps(mistakes).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    speller.setBackend(speller.HttpBackend(f'http://127.0.0.1:{server.server_port}/'))
+    speller.setCache(None)
+    yield server
+    server.shutdown()
+    speller.setBackend(speller.HttpBackend())
+    speller.setCache(cache.LRUCache(speller.CACHE_SIZE, speller.CACHE_TTL))
+
+
+def test_split_sentences():
+    text = 'Первое предложение. Второе предложение! Третье?'
+    chunks = speller.splitText(text, 25)
+    assert ''.join(chunk for _, chunk in chunks) == text
+    assert all(len(chunk) <= 25 for _, chunk in chunks)
+    assert [offset for offset, _ in chunks] == [0, 20, 40]
+
+
+def test_windows():
+    text = 'Первое предложение. Второе предложение! Третье? ' * 20
+    pieces = (text[i:i + 7] for i in range(0, len(text), 7))
+    windows = list(speller.iterWindows(pieces, 50))
+    assert ''.join(window for _, window in windows) == text
+    assert all(len(window) <= 50 for _, window in windows)
+    assert all(text.startswith(window, offset) for offset, window in windows)
+
+
+def test_single(stub):
+    mistakes = speller.getMistakes('Прагулка по полисаднику')
+    assert [(m['pos'], m['s'][0]) for m in mistakes] == [(0, 'Прогулка'), (12, 'палисаднику')]
+
+
+def test_chunked(stub, monkeypatch):
+    monkeypatch.setattr(speller, 'CHUNK_SIZE', 30)
+    text = 'Прагулка по полисаднику.\nОпять прагулка. Прагулка по полисаднику была долгой.'
+    mistakes = speller.getMistakes(text)
+    assert [text[m['pos']:m['pos'] + m['len']] for m in mistakes] == \
+        ['Прагулка', 'полисаднику', 'Прагулка', 'полисаднику']
+    last = mistakes[-1]
+    assert (last['row'], last['col']) == (1, text.rfind('полисаднику') - text.find('\n') - 1)
+
+
+def test_retry(stub, monkeypatch):
+    monkeypatch.setattr(speller, 'BACKOFF', 0)
+    StubHandler.failures = 2
+    assert len(speller.getMistakes('Прагулка')) == 1
+
+
+def test_prefilter(stub):
+    text = 'Сегодня хорошая погода.\nУтром была Прагулка по полисаднику, вечером дождь.'
+    expected = speller.getMistakes(text)
+    speller.setPrefilter(True)
+    try:
+        StubHandler.texts.clear()
+        assert speller.getMistakes(text) == expected
+        assert StubHandler.texts == ['была Прагулка по полисаднику, вечером']
+        StubHandler.texts.clear()
+        assert speller.getMistakes('Сегодня хорошая погода.') == []
+        assert StubHandler.texts == []
+    finally:
+        speller.setPrefilter(False)
+
+
+def test_cache(stub, tmp_path):
+    speller.setCache(cache.TieredCache(cache.LRUCache(), cache.SqliteCache(str(tmp_path / 'cache.db'))))
+    try:
+        speller.getMistakes('Прагулка по полисаднику\nВторой абзац')
+        StubHandler.texts.clear()
+        text = '  Прагулка по полисаднику  \nНовый абзац прагулка\nВторой абзац'
+        mistakes = speller.getMistakes(text)
+        assert StubHandler.texts == ['Новый абзац прагулка']
+        assert [(m['pos'], m['row'], m['col']) for m in mistakes] == [(2, 0, 2), (14, 0, 14)]
+        assert speller.cacheInfo()['memory']['hits'] == 2
+    finally:
+        speller.setCache(None)
+
+
+def test_breaker(stub, monkeypatch):
+    monkeypatch.setattr(speller, 'BACKOFF', 0)
+    StubHandler.failures = speller.RETRIES * 2
+    for _ in range(2):
+        with pytest.raises(speller.SpellerError):
+            speller.getMistakes('Прагулка')
+    StubHandler.failures = 0
+    with pytest.raises(speller.SpellerError):
+        speller.getMistakes('Прагулка')  # Сервис считается недоступным до истечения BREAKER_TIMEOUT
+
@@ -0,0 +1,61 @@
+from modules import translator
+
+
+def test_script():
+    assert translator.getLanguage('παράδειγμα') == 'el'
+    assert translator.getLanguage('hello') == 'en'
+    assert translator.getLanguage('123') == translator.UNKNOWN
+
+
+def test_letters():
+    assert translator.getLanguage('привіт') == 'uk'
+    assert translator.getLanguage('Прогулка') == 'ru'
+    assert translator.getLanguage('ошибка') == 'ru'
+
+
+def test_batch():
+    words = ['палисадник', 'їжак', 'garden', 'палисадник']
+    assert translator.detectLanguages(words) == ['ru', 'uk', 'en', 'ru']
+
+
+# Частые существительные, которые раньше по триграммам определялись как украинские
+RUSSIAN = '''время человек год дело жизнь день рука работа слово место лицо друг глаз вопрос дом
+    сторона страна мир случай голова ребёнок сила конец вид система часть город отношение женщина
+    деньги земля машина вода отец проблема час право нога решение дверь образ история власть закон
+    война голос тысяча книга возможность результат ночь стол имя область статья число компания народ
+    жена группа развитие процесс суд условие средство начало свет пора путь душа уровень форма связь
+    минута улица вечер качество мысль дорога мать действие месяц государство язык любовь взгляд мама
+    век школа цель общество организация президент комната порядок момент театр письмо утро помощь
+    ситуация роль рубль смысл состояние квартира внимание тело труд сын мера смерть рынок тест'''.split()
+# Украинские слова без букв і, ї, є, ґ, которых нет в русском словаре.
+# Общие с русским слова, например вода и дерево, определяются как русские
+UKRAINIAN = '''мова сонце серце обличчя дитина людина тиждень хвилина вулиця будинок дякую завжди вчора
+    чому куди який котрий щось хтось говорити бачити працювати читати слухати можна тепер'''.split()
+
+
+def test_russian_words():
+    assert [word for word in RUSSIAN if translator.detect(word)[0] != 'ru'] == []
+
+
+def test_ukrainian_words():
+    wrong = [word for word in UKRAINIAN if translator.detect(word)[0] != 'uk']
+    assert 'мова' not in wrong and 'сонце' not in wrong
+    assert len(wrong) <= len(UKRAINIAN) // 10
+
+
+def test_fallback():
+    calls = []
+
+    def backend(word):
+        calls.append(word)
+        return 'be'
+
+    translator.setFallback(backend)
+    try:
+        assert translator.getLanguage('писати') == 'be'
+        assert translator.getLanguage('писати') == 'be'
+        assert translator.getLanguage('їжак') == 'uk'
+        assert translator.getLanguage('молоко') == 'ru'  # Слово из словаря определяется уверенно
+        assert calls == ['писати']
+    finally:
+        translator.setFallback(None)
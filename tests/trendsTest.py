@@ -0,0 +1,42 @@
+from collections import Counter
+from data.mistakeEvents import MistakeEvent, HourlyStat, DailyStat
+from modules import statistics, trends
+from modules.statistics import HOUR, DAY
+import time
+
+NOW = 1000 * DAY
+
+
+def test_parts_short():
+    assert trends.parts(NOW + 90, NOW + 2 * HOUR + 1, NOW) == [(HourlyStat, 24000, 24003)]
+
+
+def test_parts_days():
+    since, until = NOW - 2 * DAY - 3 * HOUR, NOW + 5 * HOUR
+    assert trends.parts(since, until, NOW) == [(HourlyStat, 23949, 23952), (DailyStat, 998, 1000),
+                                               (HourlyStat, 24000, 24005)]
+
+
+def test_parts_old():
+    # Почасовые сводки старше HOURLY_RETENTION удалены, поэтому берутся целые сутки
+    since = NOW - statistics.HOURLY_RETENTION - 2 * DAY + HOUR
+    assert trends.parts(since, since + HOUR, NOW) == [(DailyStat, since // DAY, since // DAY + 1)]
+
+
+def test_range(db):
+    started = int(time.time())
+    statistics.write(Counter({('тренд', 'zz', None): 2}))
+    statistics.write(Counter({('тренд', 'zz', None): 1, ('редкий', 'zz', None): 1}))
+    session = db.createSession()
+    try:
+        now = int(time.time()) + 1
+        assert trends.languages(session, started, now)['zz'] == 4
+        assert ('тренд', 3) in trends.top(session, started, now, 1000)
+        assert trends.languages(session, now + DAY, now + 2 * DAY) == Counter()
+        events = session.query(MistakeEvent).filter(MistakeEvent.time >= started).count()
+        statistics.prune(now + statistics.EVENT_RETENTION + 1)
+        assert session.query(MistakeEvent).filter(MistakeEvent.time >= started).count() == 0
+        assert events > 0
+        assert trends.languages(session, started, now)['zz'] == 4  # Сводки остаются после очистки журнала
+    finally:
+        session.close()